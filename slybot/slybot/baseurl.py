@@ -57,8 +57,21 @@ def insert_base_url(html, base):
 
 
 def get_base_url(htmlpage):
-    """Return the base url of the given HtmlPage"""
+    """Return the base url of the given HtmlPage
+
+    The base url is kept in the page until its url or body change.
+    """
+    cached = getattr(htmlpage, '_base_url', None)
+    if (cached is not None and cached[0] == htmlpage.url and
+            cached[1] is htmlpage.parsed_body):
+        return cached[2]
+    base_url = htmlpage.url
     for element in htmlpage.parsed_body:
         if getattr(element, "tag", None) == "base":
-            return element.attributes.get("href") or htmlpage.url
-    return htmlpage.url
+            base_url = element.attributes.get("href") or htmlpage.url
+            break
+    try:
+        htmlpage._base_url = (htmlpage.url, htmlpage.parsed_body, base_url)
+    except AttributeError:
+        pass
+    return base_url
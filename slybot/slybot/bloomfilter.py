@@ -0,0 +1,120 @@
+"""
+Memory bounded probabilistic sets
+
+A Bloom filter answers if a key has been added before using a fixed number of
+bits. Keys that were added are always found, keys that were not added are
+found with a probability close to the configured error rate.
+"""
+import hashlib
+import math
+import struct
+
+import six
+
+GROWTH_FACTOR = 2
+TIGHTENING_RATIO = 0.9
+
+
+def _capacity(size, error_rate):
+    """Number of keys a filter of `size` bytes holds at `error_rate`"""
+    return max(1, int(size * 8 * math.log(2) ** 2 / -math.log(error_rate)))
+
+
+def _to_bytes(key):
+    if isinstance(key, six.text_type):
+        return key.encode('utf-8')
+    return key
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_hashes = max(1, int(math.ceil(-math.log(error_rate, 2))))
+        self.num_bits = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    @property
+    def size(self):
+        """Memory used by the bit array in bytes"""
+        return len(self.bits)
+
+    def _positions(self, key):
+        # Double hashing, see Kirsch and Mitzenmacher
+        first, second = struct.unpack(
+            '<QQ', hashlib.md5(_to_bytes(key)).digest())
+        return [(first + i * second) % self.num_bits
+                for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7))
+                   for p in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, key):
+        """Add a key, return False if it was probably added before"""
+        bits = self.bits
+        added = False
+        for position in self._positions(key):
+            index, mask = position >> 3, 1 << (position & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class ScalableBloomFilter(object):
+    """Bloom filter that grows as keys are added.
+
+    A new filter with more capacity and a lower error rate is added each time
+    the current one is full, so the overall error rate stays close to
+    `error_rate`. When adding a filter would use more than `max_memory` bytes
+    the oldest filters are dropped, forgetting the keys added to them. If no
+    other filter fits, the current one keeps taking keys and its error rate
+    rises instead.
+    """
+    def __init__(self, error_rate=0.001, initial_capacity=100000,
+                 max_memory=64 * 1024 * 1024):
+        self.error_rate = error_rate
+        self.max_memory = max_memory
+        error_rate *= 1 - TIGHTENING_RATIO
+        capacity = min(initial_capacity, _capacity(max_memory, error_rate))
+        self.filters = [BloomFilter(capacity, error_rate)]
+
+    @property
+    def size(self):
+        return sum(f.size for f in self.filters)
+
+    def __contains__(self, key):
+        return any(key in f for f in reversed(self.filters))
+
+    def __len__(self):
+        return sum(len(f) for f in self.filters)
+
+    def add(self, key):
+        """Add a key, return False if it was probably added before"""
+        if key in self:
+            return False
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = self._grow(current)
+        return current.add(key)
+
+    def _grow(self, current):
+        new = BloomFilter(current.capacity * GROWTH_FACTOR,
+                          current.error_rate * TIGHTENING_RATIO)
+        if new.size > self.max_memory:
+            new = BloomFilter(current.capacity, current.error_rate)
+            if new.size > self.max_memory:
+                return current
+        while self.filters and self.size + new.size > self.max_memory:
+            self.filters.pop(0)
+        self.filters.append(new)
+        return new
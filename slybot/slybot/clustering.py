@@ -1,17 +1,41 @@
+"""
+Keep page clustering data between crawls
+
+Only the tag frequencies page clustering uses are stored for each page. They
+are stored as arrays of (token id, count) pairs with the tokens kept in a
+vocabulary shared by all pages.
+"""
 import json
 import logging
 import os
 
+from array import array
+
 from scrapely.htmlpage import HtmlPage
 from scrapy import signals
 from scrapy.exceptions import NotConfigured
 from scrapy.utils.request import request_fingerprint
 from scrapy.utils.project import data_path
+from twisted.internet import reactor, task
+
 from slybot.plugins.scrapely_annotations.annotations import _CLUSTER_NA
+from slybot.plugins.scrapely_annotations.clustering import (
+    PageFeatures, FeaturesVectorizer, RESPONSE_FEATURES)
+from slybot.utils import htmlpage_from_response
+
+VOCABULARY_KEY = '_vocabulary'
+DBM_SUFFIXES = ('', '.db', '.dat', '.dir', '.pag', '.bak')
+# Pages stored by earlier versions are JSON which never starts with this
+FEATURES_MARKER = b'\x00'
+
+
+def _is_vocabulary(key):
+    return key in (VOCABULARY_KEY, VOCABULARY_KEY.encode('utf-8'))
 
 
 class PersistentClusteringMiddleware(object):
-    def __init__(self, directory, reset=False, stats=None):
+    def __init__(self, directory, reset=False, stats=None, max_pages=0,
+                 compact=False):
         try:
             import anydbm as _dbm
         except ImportError:
@@ -20,7 +44,13 @@ class PersistentClusteringMiddleware(object):
         self.directory = directory
         self.reset = reset
         self.stats = stats
+        self.max_pages = max_pages
+        self.compact = compact
         self.clustering_enabled = False
+        self.db = None
+        self.stored_pages = 0
+        self.tokens, self.vocabulary = [], {}
+        self._loading = None
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -29,7 +59,9 @@ class PersistentClusteringMiddleware(object):
             raise NotConfigured
         directory = data_path(s.get('CLUSTERING_DIR', 'clustering'))
         reset = s.getbool('CLUSTERING_RESET')
-        o = cls(directory, reset, crawler.stats)
+        o = cls(directory, reset, crawler.stats,
+                s.getint('CLUSTERING_MAX_PAGES', 0),
+                s.getbool('CLUSTERING_COMPACT'))
         crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
         return o
@@ -46,15 +78,30 @@ class PersistentClusteringMiddleware(object):
             return
         if not os.path.exists(self.directory):
             os.makedirs(self.directory)
-        dbpath = os.path.join(self.directory, spider.name)
         flag = 'n' if self.reset else 'c'
-        self.db = self.dbmodule.open(dbpath, flag=flag)
-        for data in getattr(self.db, 'itervalues', self.db.values)():
-            page, encoding = json.loads(data)
-            clustering.add_page(HtmlPage(body=page.decode(encoding)))
+        self.db = self.dbmodule.open(self._dbpath(spider), flag=flag)
+        self._load_vocabulary()
+        self.stored_pages = len(self.db)
+        if VOCABULARY_KEY in self.db:
+            self.stored_pages -= 1
+        if not isinstance(clustering.vectorizer, FeaturesVectorizer):
+            clustering.vectorizer = FeaturesVectorizer(clustering.vectorizer)
+        # Add stored pages a few at a time so the crawl can start right away
+        self._loading = task.cooperate(self._load_pages(clustering))
 
     def spider_closed(self, spider):
+        if self.db is None:
+            return
+        if self._loading is not None:
+            try:
+                self._loading.stop()
+            except task.TaskFinished:
+                pass
+        self._save_vocabulary()
+        if self.compact:
+            self._compact(spider)
         self.db.close()
+        self.db = None
 
     def process_spider_output(self, response, result, spider):
         """Store page tag details if page clustering was not available."""
@@ -63,10 +110,103 @@ class PersistentClusteringMiddleware(object):
             if (not saved and self.clustering_enabled and
                     hasattr(out, 'get') and
                     out.get('_template_cluster') == _CLUSTER_NA):
+                saved = True
+                if self.max_pages and self.stored_pages >= self.max_pages:
+                    yield out
+                    continue
                 key = request_fingerprint(response.request)
                 logging.debug('Saving %s for clustering on next crawl',
                               response.request)
-                self.db[key] = json.dumps([response.body_as_unicode(),
-                                           response.encoding])
-                saved = True
+                # Computed by the extraction worker or from the same page
+                # as parsed by the annotations plugin
+                features = response.__dict__.get(RESPONSE_FEATURES)
+                if features is None:
+                    features = PageFeatures.from_page(
+                        htmlpage_from_response(response, _add_tagids=True))
+                self.db[key] = self._encode(features)
+                self.stored_pages += 1
             yield out
+
+    def _dbpath(self, spider):
+        return os.path.join(self.directory, spider.name)
+
+    def _load_pages(self, clustering):
+        for key in self.db.keys():
+            if _is_vocabulary(key):
+                continue
+            features = self._decode(self.db[key])
+            if not isinstance(features, PageFeatures):
+                # Page stored by an earlier version, store its features
+                page, encoding = features
+                features = PageFeatures.from_page(HtmlPage(body=page))
+                self.db[key] = self._encode(features)
+            # Wait for the worker instead of blocking the reactor when its
+            # queue is full
+            while clustering.queue.full():
+                yield task.deferLater(reactor, 0.1, lambda: None)
+            clustering.add_page(features, block=False)
+            if self.stats is not None:
+                self.stats.inc_value('clustering/pages_loaded')
+            yield
+
+    def _load_vocabulary(self):
+        try:
+            self.tokens = json.loads(self.db[VOCABULARY_KEY])
+        except KeyError:
+            self.tokens = []
+        self.vocabulary = dict((token, i)
+                               for i, token in enumerate(self.tokens))
+
+    def _save_vocabulary(self):
+        self.db[VOCABULARY_KEY] = json.dumps(self.tokens)
+
+    def _encode(self, features):
+        # New tokens are only added in memory, the vocabulary is saved when
+        # the spider is closed
+        values = array('I')
+        for token, count in features.counts.items():
+            if token not in self.vocabulary:
+                self.vocabulary[token] = len(self.tokens)
+                self.tokens.append(token)
+            values.extend((self.vocabulary[token], count))
+        if hasattr(values, 'tobytes'):
+            return FEATURES_MARKER + values.tobytes()
+        return FEATURES_MARKER + values.tostring()
+
+    def _decode(self, data):
+        if data[:1] != FEATURES_MARKER:
+            return json.loads(data)
+        values = array('I', data[1:])
+        tokens = self.tokens
+        return PageFeatures(dict(
+            (tokens[token_id], count)
+            for token_id, count in zip(values[::2], values[1::2])
+            if token_id < len(tokens)))
+
+    def _compact(self, spider):
+        """Write the stored pages to a new file dropping unused space
+
+        Only CLUSTERING_MAX_PAGES pages are kept if it is set.
+        """
+        path = self._dbpath(spider)
+        compacted_path = path + '.compacted'
+        compacted = self.dbmodule.open(compacted_path, flag='n')
+        compacted[VOCABULARY_KEY] = self.db[VOCABULARY_KEY]
+        pages = 0
+        for key in self.db.keys():
+            if _is_vocabulary(key):
+                continue
+            if self.max_pages and pages >= self.max_pages:
+                break
+            compacted[key] = self.db[key]
+            pages += 1
+        compacted.close()
+        self.db.close()
+        for suffix in DBM_SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        for suffix in DBM_SUFFIXES:
+            if os.path.exists(compacted_path + suffix):
+                os.rename(compacted_path + suffix, path + suffix)
+        self.db = self.dbmodule.open(path, flag='c')
+        self.stored_pages = pages
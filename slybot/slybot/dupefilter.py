@@ -1,22 +1,224 @@
 """
 Duplicates filter middleware for autoscraping
 """
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+from scrapy.dupefilters import RFPDupeFilter
 from scrapy.exceptions import NotConfigured
 from scrapy.exceptions import DropItem
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path
+from scrapy.utils.python import to_bytes
+from scrapy.utils.request import request_fingerprint
+from w3lib.url import canonicalize_url
 
+from slybot.bloomfilter import ScalableBloomFilter
 from slybot.item import create_item_version
 
+VERSION_STORES = {
+    'memory': 'slybot.dupefilter.MemoryVersionStore',
+    'lru': 'slybot.dupefilter.LruVersionStore',
+    'compact': 'slybot.dupefilter.CompactVersionStore',
+    'dbm': 'slybot.dupefilter.DbmVersionStore',
+}
+
+
+class VersionStore(object):
+    """Store of the item versions already scraped and their urls"""
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+
+    def get(self, version):
+        """Return the url of the item with this version, None if not seen"""
+        raise NotImplementedError
+
+    def add(self, version, url):
+        raise NotImplementedError
+
+    def open(self, spider):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryVersionStore(VersionStore):
+    """Keep all item versions and urls in memory"""
+    def __init__(self):
+        self._versions = {}
+
+    def get(self, version):
+        return self._versions.get(version)
+
+    def add(self, version, url):
+        self._versions[version] = url
+
+
+class LruVersionStore(VersionStore):
+    """Keep the SLYDUPEFILTER_MAX_ITEMS most recently seen item versions"""
+    def __init__(self, max_items):
+        self._versions = OrderedDict()
+        self.max_items = max_items
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getint('SLYDUPEFILTER_MAX_ITEMS', 1000000))
+
+    def get(self, version):
+        try:
+            url = self._versions.pop(version)
+        except KeyError:
+            return None
+        self._versions[version] = url
+        return url
+
+    def add(self, version, url):
+        self._versions.pop(version, None)
+        self._versions[version] = url
+        while len(self._versions) > self.max_items:
+            self._versions.popitem(last=False)
+
+
+class CompactVersionStore(VersionStore):
+    """Keep 64 bit prefixes of the item versions without urls.
+
+    Prefixes are kept in a sorted array, new versions are merged into it in
+    batches. Once the array uses SLYDUPEFILTER_MAX_MEMORY bytes further
+    versions are added to a Bloom filter of the same size.
+    """
+    def __init__(self, max_memory, batch_size=1000, error_rate=0.001):
+        self.max_items = max_memory // 8
+        self.batch_size = batch_size
+        self._sorted = np.zeros(0, dtype=np.uint64)
+        self._pending = set()
+        self._overflow = ScalableBloomFilter(
+            error_rate, initial_capacity=max(self.max_items // 8, 1),
+            max_memory=max_memory)
+        self._overflowed = False
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getint('SLYDUPEFILTER_MAX_MEMORY',
+                                   64 * 1024 * 1024),
+                   settings.getint('SLYDUPEFILTER_BATCH_SIZE', 1000))
+
+    @staticmethod
+    def _prefix(version):
+        return np.frombuffer(version[:8], dtype=np.uint64)[0]
+
+    def get(self, version):
+        """Return an empty url if the version has been seen, None otherwise
+        """
+        prefix = self._prefix(version)
+        if prefix in self._pending:
+            return u''
+        index = self._sorted.searchsorted(prefix)
+        if index < len(self._sorted) and self._sorted[index] == prefix:
+            return u''
+        if self._overflowed and version in self._overflow:
+            return u''
+        return None
+
+    def add(self, version, url):
+        if len(self._sorted) + len(self._pending) >= self.max_items:
+            self._overflowed = True
+            self._overflow.add(version)
+            return
+        self._pending.add(self._prefix(version))
+        if len(self._pending) >= self.batch_size:
+            self._merge()
+
+    def _merge(self):
+        pending = np.fromiter(self._pending, dtype=np.uint64,
+                              count=len(self._pending))
+        self._sorted = np.union1d(self._sorted, pending)
+        self._pending = set()
+
+
+class DbmVersionStore(VersionStore):
+    """Keep item versions in a dbm file per spider.
+
+    Versions are kept across crawls unless SLYDUPEFILTER_RESET is set so items
+    scraped in previous crawls are dropped too. Writes are done in batches of
+    SLYDUPEFILTER_BATCH_SIZE versions.
+    """
+    def __init__(self, directory, reset=False, batch_size=1000):
+        try:
+            import anydbm as _dbm
+        except ImportError:
+            import dbm as _dbm
+        self.dbmodule = _dbm
+        self.directory = directory
+        self.reset = reset
+        self.batch_size = batch_size
+        self.db = None
+        self._pending = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        directory = data_path(settings.get('SLYDUPEFILTER_DIR', 'dupefilter'))
+        return cls(directory, settings.getbool('SLYDUPEFILTER_RESET'),
+                   settings.getint('SLYDUPEFILTER_BATCH_SIZE', 1000))
+
+    def open(self, spider):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        dbpath = os.path.join(self.directory, spider.name)
+        self.db = self.dbmodule.open(dbpath, flag='n' if self.reset else 'c')
+
+    def get(self, version):
+        try:
+            return self._pending[version]
+        except KeyError:
+            pass
+        try:
+            return self.db[version].decode('utf-8')
+        except KeyError:
+            return None
+
+    def add(self, version, url):
+        self._pending[version] = url
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for version, url in self._pending.items():
+            self.db[version] = url.encode('utf-8')
+        self._pending = {}
+
+    def close(self):
+        if self.db is not None:
+            self.flush()
+            self.db.close()
+            self.db = None
+
 
 class DupeFilterPipeline(object):
     def __init__(self, settings):
         if not settings.getbool('SLYDUPEFILTER_ENABLED'):
             raise NotConfigured
-        self._itemversion_cache = {}
+        store = settings.get('SLYDUPEFILTER_STORE', 'memory')
+        store_cls = load_object(VERSION_STORES.get(store, store))
+        self._itemversion_cache = store_cls.from_settings(settings)
 
     @classmethod
     def from_crawler(cls, crawler):
         return cls(crawler.settings)
 
+    def open_spider(self, spider):
+        self._itemversion_cache.open(spider)
+
+    def close_spider(self, spider):
+        self._itemversion_cache.close()
+
     def process_item(self, item, spider):
         """Checks whether a scrapy item is a dupe, based on version (not vary)
         fields of the item class"""
@@ -24,9 +226,63 @@ class DupeFilterPipeline(object):
                 item.get('_type') != getattr(item, '_display_name', 0)):
             return item
         version = create_item_version(item)
-        if version in self._itemversion_cache:
-            old_url = self._itemversion_cache[version]
+        old_url = self._itemversion_cache.get(version)
+        if old_url is not None:
+            if not old_url:
+                raise DropItem("Duplicate product scraped at <%s>" %
+                               item["url"])
             raise DropItem("Duplicate product scraped at <%s>, first one was "
                            "scraped at <%s>" % (item["url"], old_url))
-        self._itemversion_cache[version] = item["url"]
+        self._itemversion_cache.add(version, item["url"])
         return item
+
+
+# Splash arguments that change for every page rather than how it is rendered
+PAGE_SPLASH_ARGS = ('url', 'baseurl')
+_fingerprint_cache = WeakKeyDictionary()
+
+
+def splash_render_digest(splash_options):
+    """Hash of the options changing how Splash renders a page
+
+    Scripts are included by the hashes requests refer to them with. Spiders
+    store it under the 'fingerprint' key of the options of their requests.
+    """
+    args = {name: value
+            for name, value in splash_options.get('args', {}).items()
+            if name not in PAGE_SPLASH_ARGS}
+    options = [splash_options.get('endpoint'), args,
+               splash_options.get('scripts', {})]
+    return hashlib.sha1(
+        json.dumps(options, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def splash_request_fingerprint(request):
+    """Fingerprint of the page requested and how it is rendered by Splash"""
+    splash_options = request.meta.get('splash')
+    if not splash_options:
+        return request_fingerprint(request)
+    try:
+        return _fingerprint_cache[request]
+    except KeyError:
+        pass
+    digest = splash_options.get('fingerprint')
+    if digest is None:
+        digest = splash_render_digest(splash_options)
+    url = splash_options.get('args', {}).get('url') or request.url
+    fp = hashlib.sha1()
+    fp.update(to_bytes(request.method))
+    fp.update(to_bytes(canonicalize_url(url)))
+    if not request.meta.get('_splash_processed'):
+        # The body of requests sent to Splash holds the render arguments
+        # with the sources of the scripts, they are part of the digest
+        fp.update(request.body or b'')
+    fp.update(to_bytes(digest))
+    fingerprint = _fingerprint_cache[request] = fp.hexdigest()
+    return fingerprint
+
+
+class SplashAwareDupeFilter(RFPDupeFilter):
+    """Request duplicates filter taking Splash rendering into account"""
+    def request_fingerprint(self, request):
+        return splash_request_fingerprint(request)
@@ -0,0 +1,262 @@
+"""
+Extract items in worker processes instead of the reactor thread
+
+Extraction is CPU bound and blocks the downloader while it runs. When
+EXTRACTION_WORKERS is set, html responses are sent to a pool of processes
+that each build their own copy of the spider. The extracted items and
+requests are sent back and returned to scrapy through a Deferred.
+
+Links found in workers are checked against the link filter of the parent
+spider, so the filter and its stats cover the whole crawl. Page clustering
+still runs in each worker with its own model. Items are completed by the
+plugins in the worker too, and the clustering features of pages without a
+cluster are sent back, so the parent never parses the page.
+
+Only one job per worker is sent to the pool at a time so a job is timed from
+the moment a worker runs it. Workers stop jobs running for longer than
+EXTRACTION_TIMEOUT seconds, and the pool is replaced when a worker does not
+answer at all.
+"""
+import itertools
+import multiprocessing
+import signal
+import traceback
+
+import six
+
+from six.moves import cPickle as pickle
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+from scrapy.utils.reqser import request_from_dict, request_to_dict
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+
+from slybot.item import SlybotItem
+from slybot.plugins.scrapely_annotations.annotations import _CLUSTER_NA
+from slybot.plugins.scrapely_annotations.clustering import (
+    RESPONSE_FEATURES, PageFeatures)
+from slybot.utils import htmlpage_from_response
+
+_worker_spider = None
+_DONE, _FAILED, _TIMED_OUT = range(3)
+_can_time_jobs = hasattr(signal, 'setitimer')
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def _timed_out(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _init_worker(spider_cls, args, kwargs, settings):
+    global _worker_spider
+    if _can_time_jobs:
+        signal.signal(signal.SIGALRM, _timed_out)
+    kwargs = dict(kwargs, settings=Settings(settings))
+    _worker_spider = spider_cls(*args, **kwargs)
+
+
+def _item_classes(spider):
+    item_classes = {}
+    for plugin in spider.plugins.values():
+        item_classes.update(getattr(plugin, 'item_classes', {}))
+    return item_classes
+
+
+def _picklable_meta(response):
+    """Meta of the request of a response that can be sent to a worker"""
+    request = getattr(response, 'request', None)
+    meta = {}
+    for key, value in (request.meta if request is not None else {}).items():
+        try:
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            continue
+        meta[key] = value
+    return meta
+
+
+def _extract(url, headers, body, encoding, meta=None, timeout=0):
+    """Run the html handlers of the worker spider plugins on a response
+
+    Items and requests are converted to plain data so they can be sent back
+    to the parent process. Items are passed to the `process_item` hook of the
+    plugins, which the parent skips for them. Extraction is stopped after
+    `timeout` seconds if it is not 0.
+    """
+    timed = _can_time_jobs and timeout > 0
+    try:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        response = HtmlResponse(url, headers=headers, body=body,
+                                encoding=encoding,
+                                request=Request(url, meta=meta))
+        class_names = {cls: name for name, cls
+                       in _item_classes(_worker_spider).items()}
+        results, features = [], None
+        generators = _worker_spider._plugin_hook('handle_html', response)
+        for result in itertools.chain(*generators):
+            if isinstance(result, Request):
+                results.append(('request', request_to_dict(result)))
+                continue
+            _worker_spider._plugin_hook('process_item', result, response)
+            results.append(('item', (class_names.get(type(result)),
+                                     dict(result))))
+            if (features is None and
+                    result.get('_template_cluster') == _CLUSTER_NA):
+                # Stored by the persistent clustering middleware
+                features = PageFeatures.from_page(
+                    htmlpage_from_response(response, _add_tagids=True)).counts
+        return _DONE, (results, response.meta.get('n_items'), features)
+    except ExtractionTimeout:
+        return _TIMED_OUT, None
+    except Exception:
+        return _FAILED, traceback.format_exc()
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class _Job(object):
+    """Extraction of a response, sent again if its pool is replaced"""
+    def __init__(self, response):
+        self.response = response
+        self.deferred = defer.Deferred()
+        self.pool = None
+        self.timer = None
+
+
+class ExtractionPool(object):
+    # Seconds to wait for a worker after the timeout of its job before it is
+    # considered hung and the pool is replaced
+    restart_delay = 30
+
+    def __init__(self, workers, spider, args, kwargs, settings, timeout=180):
+        self.item_classes = _item_classes(spider)
+        self.timeout = timeout
+        worker_settings = dict((key, settings.get(key)) for key in settings)
+        worker_settings['EXTRACTION_WORKERS'] = 0
+        # Links are filtered by the parent spider
+        worker_settings['LINK_FILTER_ENABLED'] = False
+        self._pool_args = (workers, _init_worker,
+                           (type(spider), args, kwargs, worker_settings))
+        self.pool = multiprocessing.Pool(*self._pool_args)
+        self._slots = defer.DeferredSemaphore(workers)
+        self._jobs = set()
+
+    @classmethod
+    def from_spider(cls, spider, args, kwargs, settings):
+        """Return a pool if EXTRACTION_WORKERS is set, None otherwise
+
+        `args` and `kwargs` are the arguments used to create `spider`, the
+        workers use them to build their own copy.
+        """
+        if not settings:
+            return None
+        workers = settings.getint('EXTRACTION_WORKERS', 0)
+        if workers <= 0:
+            return None
+        return cls(workers, spider, args, kwargs, settings,
+                   settings.getfloat('EXTRACTION_TIMEOUT', 180))
+
+    def extract(self, response):
+        """Return a Deferred firing with the items and requests extracted
+        from the response in the order they were extracted
+
+        It fails if the worker fails or does not finish within `timeout`
+        seconds of starting the extraction.
+        """
+        dfd = self._slots.run(self._start, response)
+        return dfd.addCallback(self._load_results, response)
+
+    def close(self):
+        for job in self._jobs:
+            if job.timer.active():
+                job.timer.cancel()
+        self.pool.terminate()
+        self.pool.join()
+
+    def _start(self, response):
+        job = _Job(response)
+        self._jobs.add(job)
+
+        def finished(result):
+            self._jobs.discard(job)
+            if job.timer.active():
+                job.timer.cancel()
+            return result
+        job.deferred.addBoth(finished)
+        self._dispatch(job)
+        return job.deferred
+
+    def _dispatch(self, job):
+        pool = job.pool = self.pool
+        if job.timer is not None and job.timer.active():
+            job.timer.cancel()
+        job.timer = reactor.callLater(self.timeout + self.restart_delay,
+                                      self._hung, job)
+
+        def answer(method):
+            def fire(value):
+                # Answers from a replaced pool are ignored
+                if job.pool is pool and not job.deferred.called:
+                    method(value)
+            return lambda value: reactor.callFromThread(fire, value)
+        kwargs = {}
+        if six.PY3:
+            kwargs['error_callback'] = answer(
+                lambda e: job.deferred.errback(Failure(e)))
+        response = job.response
+        pool.apply_async(
+            _extract,
+            (response.url, dict(response.headers), response.body,
+             response.encoding, _picklable_meta(response), self.timeout),
+            callback=answer(job.deferred.callback), **kwargs)
+
+    def _hung(self, job):
+        """Fail a job whose worker does not answer and replace the pool"""
+        pool = job.pool
+        job.deferred.errback(Failure(ExtractionTimeout(
+            'Extraction worker hung on %s' % job.response.url)))
+        if pool is not self.pool:
+            return
+        self.pool = multiprocessing.Pool(*self._pool_args)
+        reactor.callInThread(pool.terminate)
+        for other in list(self._jobs):
+            if other.pool is pool:
+                self._dispatch(other)
+
+    def _load_results(self, result, response):
+        status, data = result
+        if status == _TIMED_OUT:
+            raise ExtractionTimeout('Extraction timed out for %s' %
+                                    response.url)
+        if status == _FAILED:
+            raise RuntimeError('Extraction failed for %s:\n%s' %
+                               (response.url, data))
+        results, n_items, features = data
+        if features is not None:
+            response.__dict__[RESPONSE_FEATURES] = PageFeatures(features)
+        if n_items is not None:
+            try:
+                response.meta['n_items'] = n_items
+            except AttributeError:
+                pass  # response not tied to any request
+        loaded = []
+        for kind, value in results:
+            if kind == 'request':
+                loaded.append(request_from_dict(value))
+            else:
+                loaded.append(self._load_item(*value))
+        return loaded
+
+    def _load_item(self, item_cls_name, data):
+        item_cls = self.item_classes.get(item_cls_name)
+        if item_cls is None:
+            default_meta = {'type': 'text', 'required': False,
+                            'vary': False}
+            item_cls = SlybotItem.create_iblitem_class(
+                {'fields': {k: default_meta for k in data}})
+        return item_cls(data)
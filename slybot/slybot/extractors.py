@@ -1,10 +1,12 @@
+import copy
 import re
 
 from scrapely.extractors import htmlregion
 from scrapely.htmlpage import HtmlPageRegion
 
 from slybot.fieldtypes import FieldTypeManager
-from slybot.item import SlybotFieldDescriptor, SlybotItemDescriptor
+from slybot.item import (SlybotFieldDescriptor, SlybotItemDescriptor,
+                         create_slybot_item_descriptor)
 
 
 def create_regex_extractor(pattern):
@@ -31,8 +33,7 @@ def create_regex_extractor(pattern):
 
 
 def create_type_extractor(_type):
-    types = FieldTypeManager()
-    extractor = types.type_processor_class(_type)()
+    extractor = FieldTypeManager().type_processor(_type)
 
     def _extractor(txt, htmlpage=None):
         if txt is None:
@@ -61,10 +62,19 @@ class PipelineExtractor:
         return repr(self.extractors)
 
 
-def apply_extractors(descriptor, template_extractors, extractors):
-    type_processor_class = FieldTypeManager().type_processor_class
+def apply_extractors(descriptor, template_extractors, extractors,
+                     compiled=None):
+    """Apply the template extractors to the fields of the descriptor
+
+    Fields are replaced instead of modified so descriptors sharing fields
+    with this one are not changed. Regular expression extractors are taken
+    from `compiled` when given.
+    """
+    type_manager = FieldTypeManager()
     if isinstance(template_extractors, dict):
         template_extractors = template_extractors.items()
+    if compiled is None:
+        compiled = {}
     attribute_map = descriptor.attribute_map
     for field_name, field_extractors in template_extractors:
         equeue = []
@@ -72,35 +82,84 @@ def apply_extractors(descriptor, template_extractors, extractors):
             e_doc = extractors.get(eid, {})
             if "regular_expression" in e_doc:
                 equeue.append(
+                    compiled.get(eid) or
                     create_regex_extractor(e_doc["regular_expression"]))
             elif "type_extractor" in e_doc:  # overrides default one
                 try:
                     display_name = attribute_map[field_name].description
                 except KeyError:
                     display_name = field_name
-                field_type = type_processor_class(e_doc["type_extractor"])()
                 attribute_map[field_name] = SlybotFieldDescriptor(
-                    field_name, display_name, field_type)
+                    field_name, display_name,
+                    type_manager.type_processor(e_doc["type_extractor"]))
         if field_name not in attribute_map:
             # if not defined type extractor, use text type by default, as it is
             # by far the most commonly used
             attribute_map[field_name] = SlybotFieldDescriptor(
-                field_name, field_name,
-                type_processor_class("text")())
+                field_name, field_name, type_manager.type_processor("text"))
 
         if equeue:
-            equeue.insert(0, attribute_map[field_name].extractor)
-            attribute_map[field_name].extractor = PipelineExtractor(*equeue)
+            field = copy.copy(attribute_map[field_name])
+            equeue.insert(0, field.extractor)
+            field.extractor = PipelineExtractor(*equeue)
+            attribute_map[field_name] = field
 
 
-def add_extractors_to_descriptors(descriptors, extractors):
-    new_extractors = {}
+def compile_extractors(extractors):
+    """Create the extractor functions for the project extractors"""
+    compiled = {}
     for _id, data in extractors.items():
         if "regular_expression" in data:
             extractor = create_regex_extractor(data['regular_expression'])
         else:
             extractor = create_type_extractor(data['type_extractor'])
-        new_extractors[_id] = extractor
+        compiled[_id] = extractor
+    return compiled
+
+
+def add_extractors_to_descriptors(descriptors, extractors, compiled=None):
+    if compiled is None:
+        compiled = compile_extractors(extractors)
     for descriptor in descriptors.values():
         if isinstance(descriptor, SlybotItemDescriptor):
-            descriptor.extractors = new_extractors
+            descriptor.extractors = compiled
+
+
+class DescriptorRegistry(object):
+    """Item descriptors shared by all the templates of a spider
+
+    A descriptor is created once for each schema. Templates with their own
+    extractors get a copy of it sharing the fields the extractors do not
+    change, templates with the same extractors share the same copy.
+    """
+    def __init__(self, schemas, extractors):
+        self.schemas = schemas
+        self.extractors = extractors
+        self.compiled = compile_extractors(extractors)
+        self._descriptors = {}
+
+    def descriptor(self, schema_name, template_extractors=None):
+        key = (schema_name, _extractors_key(template_extractors))
+        try:
+            return self._descriptors[key]
+        except KeyError:
+            pass
+        if key[1]:
+            base = self.descriptor(schema_name)
+            descriptor = SlybotItemDescriptor(
+                base.name, base.description, base.attribute_map.values())
+            apply_extractors(descriptor, template_extractors, self.extractors,
+                             self.compiled)
+        else:
+            descriptor = create_slybot_item_descriptor(
+                self.schemas[schema_name], schema_name)
+        descriptor.extractors = self.compiled
+        self._descriptors[key] = descriptor
+        return descriptor
+
+
+def _extractors_key(template_extractors):
+    if isinstance(template_extractors, dict):
+        template_extractors = template_extractors.items()
+    return tuple(sorted((field, tuple(ids))
+                        for field, ids in template_extractors or ()))
@@ -33,6 +33,7 @@ class FieldTypeManager(object):
         DateTimeFieldTypeProcessor
     ))
     _names = sorted(_TYPEMAP.keys())
+    _processors = {}
 
     def available_type_names(self):
         """Find the names of all field types available. """
@@ -47,6 +48,21 @@ class FieldTypeManager(object):
         """
         return self._TYPEMAP.get(name, RawFieldTypeProcessor)
 
+    def type_processor(self, name, **options):
+        """Retrieve a processor for the given type
+
+        A single instance of each type and options is shared by all the
+        fields using it, in every spider and thread. Processors keeping
+        state, like the cache of parsed dates, have to guard it.
+        """
+        pclass = self.type_processor_class(name)
+        key = (pclass, tuple(sorted(options.items())))
+        try:
+            return self._processors[key]
+        except KeyError:
+            processor = self._processors[key] = pclass(**options)
+            return processor
+
     def all_processor_classes(self):
         """Retrieve all processor classes registered"""
         return list(self._TYPEMAP.values())
@@ -1,3 +1,8 @@
+import threading
+import time
+
+from collections import OrderedDict
+
 from .text import TextFieldTypeProcessor
 from dateparser.date import DateDataParser
 
@@ -13,16 +18,81 @@ class DateTimeFieldTypeProcessor(TextFieldTypeProcessor):
     >>> d.adapt(u"Jan 12, 2014 11:15AM", None).strftime('%Y-%m-%dT%H:%M:%S')
     '2014-01-12T11:15:00'
     >>> d.adapt(u'no date here', None)
+    >>> [x.year for x in d.adapt_many([u'Jan 12, 2014', u'Jan 12, 2014'])]
+    [2014, 2014]
+
+    Parsed dates are cached by their text and the current period of
+    `cache_period` seconds of the clock, the cache is emptied when the next
+    period starts. Relative dates such as 'Today' or '2 hours ago' are thus
+    resolved at most `cache_period` seconds late, and never across a change
+    of day as periods of a minute start with every day. Processors are
+    shared between spiders and threads so the cache is used under a lock.
     """
 
     name = 'date'
     description = 'Extracts date and time information from a string'
+    cache_size = 10000
+    cache_period = 60
+    _parsers = {}
+    _parsers_lock = threading.Lock()
+
+    def __init__(self, languages=None):
+        self.languages = tuple(languages) if languages else None
+        self._cache = OrderedDict()
+        self._cache_period = None
+        self._lock = threading.Lock()
 
     def extract(self, htmlregion):
         return super(DateTimeFieldTypeProcessor, self).extract(htmlregion)
 
     def adapt(self, text, htmlpage=None):
+        return self.adapt_many([text], htmlpage)[0]
+
+    def adapt_many(self, texts, htmlpage=None):
+        """Parse several dates sharing the parser and cache lookups"""
+        with self._lock:
+            return self._adapt_many(texts)
+
+    def _adapt_many(self, texts):
+        period = int(time.time() // self.cache_period)
+        if period != self._cache_period:
+            self._cache.clear()
+            self._cache_period = period
+        cache, parser = self._cache, None
+        dates = []
+        for text in texts:
+            try:
+                date = cache.pop(text)
+            except KeyError:
+                if parser is None:
+                    parser = self._parser()
+                date = self._parse(parser, text)
+            except TypeError:  # Not hashable
+                dates.append(self._parse(parser or self._parser(), text))
+                continue
+            cache[text] = date
+            dates.append(date)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return dates
+
+    def _parser(self):
+        try:
+            return self._parsers[self.languages]
+        except KeyError:
+            pass
+        with self._parsers_lock:
+            if self.languages not in self._parsers:
+                if self.languages:
+                    parser = DateDataParser(languages=list(self.languages))
+                else:
+                    parser = DateDataParser(allow_redetect_language=True)
+                self._parsers[self.languages] = parser
+            return self._parsers[self.languages]
+
+    @staticmethod
+    def _parse(parser, text):
         try:
-            return DateDataParser().get_date_data(text)['date_obj']
+            return parser.get_date_data(text)['date_obj']
         except ValueError:
             return
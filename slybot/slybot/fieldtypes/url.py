@@ -20,15 +20,31 @@ class UrlFieldTypeProcessor(object):
         return ''
 
     def adapt(self, text, htmlpage=None):
+        return self.adapt_many([text], htmlpage)[0]
+
+    def adapt_many(self, texts, htmlpage=None):
+        """Join several urls with the base url of the page"""
         if htmlpage is None:
-            return text
-        if text is None:
-            return
+            return list(texts)
         encoding = getattr(htmlpage, 'encoding', 'utf-8')
+        base = get_base_url(htmlpage).encode(encoding)
+        base_url = strip_url(unquote_markup(base, encoding=encoding))
+        joined = {}
+        urls = []
+        for text in texts:
+            if text is None:
+                urls.append(None)
+                continue
+            try:
+                url = joined[text]
+            except KeyError:
+                url = joined[text] = self._join(base_url, text, encoding)
+            urls.append(url)
+        return urls
+
+    @staticmethod
+    def _join(base_url, text, encoding):
         text = text.encode(encoding)
         unquoted = unquote_markup(text, encoding=encoding)
         cleaned = strip_url(disallowed.sub('', unquoted))
-        base = get_base_url(htmlpage).encode(encoding)
-        base_url = strip_url(unquote_markup(base, encoding=encoding))
-        joined = urljoin(base_url, cleaned)
-        return safe_download_url(joined)
+        return safe_download_url(urljoin(base_url, cleaned))
@@ -1,3 +1,4 @@
+import copy
 import hashlib
 from collections import defaultdict, namedtuple
 
@@ -39,8 +40,11 @@ def create_slybot_item_descriptor(schema, schema_name=""):
     for pname, pdict in schema.get('fields', {}).items():
         required = pdict['required']
         pdisplay_name = pdict.get('name', pname)
-        pclass = field_type_manager.type_processor_class(pdict['type'])
-        processor = pclass()
+        options = {}
+        if pdict['type'] == 'date' and pdict.get('languages'):
+            options['languages'] = tuple(pdict['languages'])
+        processor = field_type_manager.type_processor(pdict['type'],
+                                                      **options)
         descriptor = SlybotFieldDescriptor(pname, pdisplay_name, processor,
                                            required)
         descriptors.append(descriptor)
@@ -70,6 +74,13 @@ class SlybotFieldDescriptor(FieldDescriptor):
                               self._processor.description,
                               self.extractor, self.adapt)
 
+    def adapt_many(self, values, htmlpage=None):
+        """Adapt several values at once if the field type supports it"""
+        adapt_many = getattr(self._processor, 'adapt_many', None)
+        if adapt_many is None:
+            return [self.adapt(v, htmlpage) for v in values]
+        return adapt_many(values, htmlpage)
+
     def __str__(self):
         return "SlybotFieldDescriptor(%s, %s)" % (self.name,
                                                   self._processor.name)
@@ -80,11 +91,8 @@ class SlybotItemDescriptor(ItemDescriptor):
         return "SlybotItemDescriptor(%s)" % self.name
 
     def copy(self):
-        attribute_descriptors = []
-        for d in self.attribute_map.values():
-            attribute_descriptors.append(
-                SlybotFieldDescriptor(d.name, d.description, d.processor,
-                                      d.required))
+        attribute_descriptors = [copy.copy(d)
+                                 for d in self.attribute_map.values()]
         return SlybotItemDescriptor(self.name, self.description,
                                     attribute_descriptors)
 
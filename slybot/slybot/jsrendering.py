@@ -0,0 +1,50 @@
+"""
+Statistics used to decide which pages are rendered with Splash
+
+With render on miss pages are first downloaded without Splash and only
+rendered when no items can be extracted from them. The outcome of both
+downloads is kept by url pattern so that patterns whose pages always need
+to be rendered are sent to Splash directly, and patterns whose pages have
+no items even after rendering are not rendered at all.
+"""
+from collections import OrderedDict
+
+from slybot.utils import url_pattern
+
+RAW_ITEMS, RENDERED_ITEMS, RENDERED_EMPTY = range(3)
+
+
+class RenderStats(object):
+    """Results of raw and rendered downloads by url pattern"""
+    def __init__(self, min_pages=10, max_patterns=10000):
+        self.min_pages = min_pages
+        self.max_patterns = max_patterns
+        self._stats = OrderedDict()
+
+    def _get(self, url):
+        return self._stats.get(url_pattern(url))
+
+    def needs_rendering(self, url):
+        """Whether pages like `url` are only useful once rendered"""
+        stats = self._get(url)
+        return bool(stats and not stats[RAW_ITEMS] and
+                    stats[RENDERED_ITEMS] >= self.min_pages)
+
+    def render_on_miss(self, url):
+        """Whether to render pages like `url` with no items without Splash"""
+        stats = self._get(url)
+        return not (stats and not stats[RENDERED_ITEMS] and
+                    stats[RENDERED_EMPTY] >= self.min_pages)
+
+    def record(self, url, rendered, found_items):
+        pattern = url_pattern(url)
+        stats = self._stats.pop(pattern, None) or [0, 0, 0]
+        self._stats[pattern] = stats
+        if len(self._stats) > self.max_patterns:
+            self._stats.popitem(last=False)
+        if not rendered:
+            stats[RAW_ITEMS] += bool(found_items)
+        elif found_items:
+            stats[RENDERED_ITEMS] += 1
+        else:
+            stats[RENDERED_EMPTY] += 1
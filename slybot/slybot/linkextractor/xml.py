@@ -1,19 +1,65 @@
 """
 Link extraction for auto scraping
 """
+import gzip
+
+from io import BytesIO
+
+import six
+
+from lxml import etree
 from scrapy.link import Link
 from scrapy.selector import Selector
 
 from slybot.linkextractor.base import BaseLinkExtractor
 
+GZIP_MAGIC_NUMBER = b'\x1f\x8b'
+
+
+class _XmlStream(object):
+    """File like object that skips whitespace before the xml declaration"""
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.started = False
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        while not self.started and data:
+            data = data.lstrip()
+            if data:
+                self.started = True
+            else:
+                data = self.fileobj.read(size)
+        return data
+
+
+def xml_stream(body):
+    """File like object reading the body, decompressed if it is gzipped"""
+    stream = BytesIO(body)
+    if body[:2] == GZIP_MAGIC_NUMBER:
+        stream = gzip.GzipFile(fileobj=stream)
+    return _XmlStream(stream)
+
+
 class XmlLinkExtractor(BaseLinkExtractor):
     """Link extractor for XML sources"""
+    # Paths of tag names ending in the elements holding links and the
+    # attribute holding the link or None for their text. Extractors defining
+    # them can read feeds incrementally with `streaming`
+    stream_paths = ()
+
     def __init__(self, xpath, **kwargs):
         self.remove_namespaces = kwargs.pop('remove_namespaces', False)
+        self.streaming = kwargs.pop('streaming', False)
         super(XmlLinkExtractor, self).__init__(**kwargs)
         self.xpath = xpath
 
     def _extract_links(self, response):
+        if self.streaming and self.stream_paths:
+            return self._iter_links(response)
+        return self._select_links(response)
+
+    def _select_links(self, response):
         type = 'html'
         if response.body_as_unicode().strip().startswith('<?xml version='):
             type = 'xml'
@@ -23,18 +69,55 @@ class XmlLinkExtractor(BaseLinkExtractor):
         for url in xxs.xpath(self.xpath).extract():
             yield Link(url.encode(response.encoding))
 
+    def _iter_links(self, response):
+        """Parse the body incrementally dropping the elements already read"""
+        encoding = getattr(response, 'encoding', 'utf-8')
+        tags = []
+        for event, element in etree.iterparse(
+                xml_stream(response.body), events=('start', 'end'),
+                recover=True, huge_tree=True):
+            tag = element.tag
+            if not isinstance(tag, six.string_types):
+                continue
+            if self.remove_namespaces:
+                tag = tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                tags.append(tag)
+                continue
+            for path, attribute in self.stream_paths:
+                if tuple(tags[-len(path):]) == path:
+                    if attribute is None:
+                        url = element.text
+                    else:
+                        url = element.get(attribute)
+                    if url:
+                        yield Link(url.encode(encoding))
+                    break
+            tags.pop()
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
 class RssLinkExtractor(XmlLinkExtractor):
     """Link extraction from RSS feeds"""
+    stream_paths = ((('item', 'link'), None),)
+
     def __init__(self, **kwargs):
         super(RssLinkExtractor, self).__init__("//item/link/text()", **kwargs)
 
 class SitemapLinkExtractor(XmlLinkExtractor):
     """Link extraction for sitemap.xml feeds"""
+    stream_paths = ((('urlset', 'url', 'loc'), None),
+                    (('sitemapindex', 'sitemap', 'loc'), None))
+
     def __init__(self, **kwargs):
         kwargs['remove_namespaces'] = True
         super(SitemapLinkExtractor, self).__init__("//urlset/url/loc/text() | //sitemapindex/sitemap/loc/text()", **kwargs)
 
 class AtomLinkExtractor(XmlLinkExtractor):
+     stream_paths = ((('link',), 'href'),)
+
      def __init__(self, **kwargs):
         kwargs['remove_namespaces'] = True
         super(AtomLinkExtractor, self).__init__("//link/@href", **kwargs)
@@ -1,6 +1,10 @@
 import json
 import re
 
+from weakref import WeakKeyDictionary
+
+from slybot.splashscripts import splash_scripts
+
 LUA_SOURCE = """
 function main(splash)
     assert(splash:go(splash.args.url))
@@ -10,6 +14,7 @@ function main(splash)
     return splash.html()
 end
 """
+LUA_SCRIPT = splash_scripts.register(LUA_SOURCE)
 
 JS_SOURCE = """
 function main(splash) {
@@ -35,21 +40,68 @@ def filter_for_url(url):
         return True
     return _filter
 
+class PageActions(object):
+    """Page actions of a spider with their url patterns compiled
+
+    The script performing the actions for a url is built once for each set
+    of actions matching urls.
+    """
+    def __init__(self, page_actions):
+        self.page_actions = [
+            (_compile(action.get('accept')), _compile(action.get('reject')),
+             action)
+            for action in page_actions]
+        self._scripts = {}
+
+    def script_for_url(self, url):
+        """Key of the script performing the actions for `url` if any"""
+        matching = tuple(
+            i for i, (accept, reject, _) in enumerate(self.page_actions)
+            if not (reject and reject.search(url)) and
+            (not accept or accept.search(url)))
+        if not matching:
+            return None
+        try:
+            return self._scripts[matching]
+        except KeyError:
+            events = [self.page_actions[i][2] for i in matching]
+            script = splash_scripts.register(JS_SOURCE % json.dumps(events))
+            self._scripts[matching] = script
+            return script
+
+
+def _compile(pattern):
+    return re.compile(pattern) if pattern else None
+
+
 class PageActionsMiddleware(object):
+    def __init__(self):
+        self._page_actions = WeakKeyDictionary()
+
+    def _spider_page_actions(self, spider):
+        events = spider.page_actions
+        try:
+            compiled_events, page_actions = self._page_actions[spider]
+            if compiled_events is events:
+                return page_actions
+        except KeyError:
+            pass
+        page_actions = PageActions(events)
+        self._page_actions[spider] = (events, page_actions)
+        return page_actions
+
     def process_request(self, request, spider):
         splash_options = request.meta.get('splash', None)
         if not splash_options: # Already processed or JS disabled
             return
         splash_args = splash_options.get('args', {})
-        events = spider.page_actions
         url = splash_args['url']
-        events = filter(filter_for_url(url), events)
-        if len(events):
+        script = self._spider_page_actions(spider).script_for_url(url)
+        if script is not None:
             splash_options['endpoint'] = 'execute'
-            splash_args.update({
-                "lua_source": LUA_SOURCE,
-                "slybot_actions_source": (JS_SOURCE % json.dumps(events)),
+            splash_options.setdefault('scripts', {}).update({
+                "lua_source": LUA_SCRIPT,
+                "slybot_actions_source": script,
             })
 
 __all__ = ['PageActionsMiddleware']
-
@@ -6,20 +6,25 @@ import re
 
 from collections import OrderedDict
 
+from scrapy import signals
 from scrapy.http import Request
 from scrapy.utils.misc import arg_to_iter
+from scrapy.utils.url import canonicalize_url
 
 from scrapely.extraction import InstanceBasedLearningExtractor
 from scrapely.htmlpage import HtmlPage, dict_to_page
 
+from slybot.bloomfilter import ScalableBloomFilter
 from slybot.linkextractor import create_linkextractor_from_specs
 from slybot.linkextractor.html import HtmlLinkExtractor
-from slybot.linkextractor.xml import SitemapLinkExtractor
+from slybot.linkextractor.xml import SitemapLinkExtractor, XmlLinkExtractor
 from slybot.linkextractor.pagination import PaginationExtractor
+from slybot.templatecache import TemplateCache
 from slybot.item import SlybotItem, create_slybot_item_descriptor
-from slybot.extractors import apply_extractors, add_extractors_to_descriptors
+from slybot.extractors import DescriptorRegistry
 from slybot.utils import (htmlpage_from_response, include_exclude_filter,
                           _build_sample)
+from .clustering import BackgroundClustering, PageFeatures
 from .extraction import SlybotIBLExtractor
 XML_APPLICATION_TYPE = re.compile('application/((?P<type>[a-z]+)\+)?xml').match
 _CLUSTER_NA = 'not available'
@@ -36,6 +41,7 @@ class Annotations(object):
         Perform any initialization needed for crawling using this plugin
         """
         self.logger = logger
+        self.template_cache = TemplateCache.from_settings(settings)
         templates = map(self._get_annotated_template, spec['templates'])
 
         _item_template_pages = sorted((
@@ -61,23 +67,21 @@ class Annotations(object):
         # Create descriptors and apply additional extractors to fields
         page_descriptor_pairs = []
         self.schema_descriptors = {}
+        registry = DescriptorRegistry(items, extractors)
         for default, template, template_extractors, v in _item_template_pages:
             descriptors = OrderedDict()
-            for schema_name, schema in items.items():
-                item_descriptor = create_slybot_item_descriptor(schema,
-                                                                schema_name)
-                apply_extractors(item_descriptor, template_extractors,
-                                 extractors)
-                descriptors[schema_name] = item_descriptor
+            for schema_name in items:
+                descriptors[schema_name] = registry.descriptor(
+                    schema_name, template_extractors)
             descriptor = descriptors.values() or [{}]
             descriptors['#default'] = descriptors.get(default, descriptor[0])
             self.schema_descriptors[template.page_id] = descriptors['#default']
             page_descriptor_pairs.append((template, descriptors, v))
-            add_extractors_to_descriptors(descriptors, extractors)
 
         grouped = itertools.groupby(sorted(page_descriptor_pairs,
                                            key=operator.itemgetter(2)),
                                     lambda x: x[2] < '0.13.0')
+        candidates = settings.getint('TEMPLATE_INDEX_CANDIDATES', 5)
         self.extractors = []
         for version, group in grouped:
             if version:
@@ -86,7 +90,9 @@ class Annotations(object):
                         [(page, scrapes['#default'])
                          for page, scrapes, version in group]))
             else:
-                self.extractors.append(SlybotIBLExtractor(list(group)))
+                self.extractors.append(
+                    SlybotIBLExtractor(list(group), candidates=candidates,
+                                       template_cache=self.template_cache))
 
         # generate ibl extractor for links pages
         _links_pages = [dict_to_page(t, 'annotated_body')
@@ -97,12 +103,17 @@ class Annotations(object):
             if _links_pages else None
 
         self.build_url_filter(spec)
+        self.link_filter = self._create_link_filter(settings)
+        self.xml_streaming = settings.getbool('XML_LINKS_STREAMING')
+        self.stats = None
         # Clustering
         self.template_names = [t.get('page_id') for t in spec['templates']]
         if settings.get('PAGE_CLUSTERING'):
             try:
                 import page_clustering
-                self.clustering = page_clustering.kmeans_from_samples(spec['templates'])
+                self.clustering = BackgroundClustering.from_settings(
+                    page_clustering.kmeans_from_samples(spec['templates']),
+                    settings)
                 self.logger.info("Clustering activated")
             except ImportError:
                 self.clustering = None
@@ -114,7 +125,7 @@ class Annotations(object):
     def _get_annotated_template(self, template):
         if (template.get('version', '0.12.0') >= '0.13.0' and
                 not template.get('annotated')):
-            _build_sample(template)
+            _build_sample(template, self.template_cache)
         return template
 
     def handle_html(self, response, seen=None):
@@ -211,7 +222,7 @@ class Annotations(object):
                 value = [self._process_attributes(v, descriptor, page)
                          for v in value]
             elif field in attr_map:
-                value = [attr_map[field].adapt(v, page) for v in value]
+                value = attr_map[field].adapt_many(value, page)
             new_item[field] = value
         return new_item
 
@@ -238,30 +249,75 @@ class Annotations(object):
 
         self.url_filterf = url_filterf
 
+    def _create_link_filter(self, settings):
+        """Filter of the links followed during the whole crawl
+
+        Only created if LINK_FILTER_ENABLED is set. Urls are added once their
+        requests are scheduled, so links dropped by the spider middlewares,
+        for example for being too deep, can be followed from other pages.
+        """
+        if not settings.getbool('LINK_FILTER_ENABLED'):
+            return None
+        return ScalableBloomFilter(
+            settings.getfloat('LINK_FILTER_ERROR_RATE', 0.001),
+            settings.getint('LINK_FILTER_INITIAL_CAPACITY', 100000),
+            settings.getint('LINK_FILTER_MAX_MEMORY', 64 * 1024 * 1024))
+
+    def setup_crawler(self, crawler):
+        self.stats = crawler.stats
+        if self.link_filter is not None:
+            crawler.signals.connect(self.request_scheduled,
+                                    signal=signals.request_scheduled)
+        if self.clustering:
+            self.clustering.stats = crawler.stats
+            crawler.signals.connect(self.clustering.close,
+                                    signal=signals.spider_closed)
+
     def _cluster_page(self, htmlpage):
         template_cluster, preferred = _CLUSTER_NA, None
         if self.clustering:
-            self.clustering.add_page(htmlpage)
-            if self.clustering.is_fit:
-                clt = self.clustering.classify(htmlpage)
-                if clt != -1:
-                    template_cluster = preferred = self.template_names[clt]
-                else:
-                    template_cluster = _CLUSTER_OUTLIER
+            features = PageFeatures.from_page(htmlpage)
+            self.clustering.add_page(features, block=False)
+            clt = self.clustering.classify(features, htmlpage.url)
+            if clt == -1:
+                template_cluster = _CLUSTER_OUTLIER
+            elif clt is not None:
+                template_cluster = preferred = self.template_names[clt]
         return template_cluster, preferred
 
-
     def _filter_link(self, link, seen):
         url = link.url
         if self.url_filterf(link):
             # filter out duplicate urls, later we should handle link text
             if url not in seen:
                 seen.add(url)
+                if not self._is_new_link(url):
+                    return
                 request = Request(url)
                 if link.text:
                     request.meta['link_text'] = link.text
                 return request
 
+    def _is_new_link(self, url):
+        """Check the link filter for links followed in earlier pages"""
+        if self.link_filter is None:
+            return True
+        is_new = canonicalize_url(url) not in self.link_filter
+        if self.stats is not None:
+            self.stats.inc_value('link_filter/%s' %
+                                 ('misses' if is_new else 'hits'))
+        return is_new
+
+    def is_new_request(self, request):
+        """Check a request extracted in a worker against the link filter"""
+        return self._is_new_link(request.url)
+
+    def request_scheduled(self, request, spider):
+        """Add the url of a request to the link filter"""
+        # Requests sent to Splash were added with the url of their page
+        if '_splash_processed' not in request.meta:
+            self.link_filter.add(canonicalize_url(request.url))
+
     def _process_link_regions(self, htmlpage, link_regions):
         """Process link regions if any, and generate requests"""
         if link_regions:
@@ -309,6 +365,8 @@ class Annotations(object):
             })
         except ValueError:
             link_extractor = SitemapLinkExtractor()
+        if isinstance(link_extractor, XmlLinkExtractor):
+            link_extractor.streaming = self.xml_streaming
         for link in link_extractor.links_to_follow(response):
             request = self._filter_link(link, seen)
             if request:
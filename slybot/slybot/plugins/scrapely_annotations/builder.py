@@ -2,7 +2,7 @@ import json
 
 from scrapy import Selector
 from scrapy.utils.spider import arg_to_iter
-from scrapely.htmlpage import parse_html, HtmlTag, HtmlDataFragment
+from scrapely.htmlpage import HtmlTag, HtmlDataFragment
 
 from collections import defaultdict
 from itertools import tee, count, groupby
@@ -359,12 +359,12 @@ def add_repeated_field(annotation, elems, page):
 def apply_annotations(annotations, target_page):
     selector_annotations, tagid_annotations = _filter_annotations(annotations)
     inserts = defaultdict(list)
-    numbered_html = add_tagids(target_page)
+    numbered_html, numbered_elements = add_tagids(target_page, parsed=True)
     if selector_annotations:
         converted_annotations = apply_selector_annotations(
             selector_annotations, numbered_html)
         tagid_annotations += converted_annotations
-    target = iter(parse_html(numbered_html))
+    target = iter(numbered_elements)
     output, tag_stack = [], []
     element = next(target)
     last_id = 0
@@ -0,0 +1,227 @@
+"""
+Page clustering run in a background thread
+
+Pages are reduced to their tag frequencies and sent to a worker thread
+through a bounded queue. The worker adds them to the clustering model and
+publishes a copy of the model at most every `refit_interval` seconds.
+Pages are classified with the last published copy so extraction never
+waits for the model to be refit.
+"""
+from __future__ import absolute_import
+
+import copy
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+import numpy as np
+
+from scrapely.htmlpage import HtmlTag, HtmlTagType
+from six.moves import queue
+
+from slybot.utils import url_pattern
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def _tag_token(tag):
+    """Tag name and classes as used by page clustering tag frequencies"""
+    classes = (tag.attributes.get('class') or '').split()
+    return ' '.join([tag.tag] + sorted(set(classes)))
+
+
+# Response attribute with the features of its page when they were computed
+# by an extraction worker
+RESPONSE_FEATURES = '_slybot_page_features'
+
+
+class PageFeatures(object):
+    """Tag frequencies of a page, the features used for page clustering"""
+    __slots__ = ('counts',)
+
+    def __init__(self, counts):
+        self.counts = counts
+
+    @classmethod
+    def from_page(cls, page):
+        counts = {}
+        for fragment in page.parsed_body:
+            if (isinstance(fragment, HtmlTag) and
+                    fragment.tag_type != HtmlTagType.CLOSE_TAG):
+                token = _tag_token(fragment)
+                counts[token] = counts.get(token, 0) + 1
+        return cls(counts)
+
+    def tokens(self):
+        """Tokens as used by the page clustering tag frequency vectorizer"""
+        for token, count in self.counts.items():
+            tag_and_classes = token.split(' ')
+            yield (tag_and_classes[0], frozenset(tag_and_classes[1:])), count
+
+
+class FeaturesVectorizer(object):
+    """Page clustering vectorizer that accepts PageFeatures as pages
+
+    A `read_only` vectorizer ignores tokens not seen while fitting instead
+    of adding them to the dictionary, so classifying never changes it.
+    """
+    def __init__(self, vectorizer, read_only=False):
+        self.vectorizer = vectorizer
+        self.read_only = read_only
+
+    @property
+    def dimension(self):
+        return self.vectorizer.dimension
+
+    def __call__(self, page):
+        if not isinstance(page, PageFeatures):
+            return self.vectorizer(page)
+        dictionary = self.vectorizer.dictionary
+        counts = []
+        for token, count in page.tokens():
+            if token not in dictionary:
+                if self.read_only:
+                    continue
+                dictionary[token] = self.vectorizer.dimension
+                self.vectorizer.dimension += 1
+            counts.append((dictionary[token], count))
+        vector = np.zeros((len(dictionary),))
+        for index, count in counts:
+            vector[index] += count
+        return vector
+
+
+class BackgroundClustering(object):
+    """Fit a page clustering model in a worker thread.
+
+    `clustering` is only used by the worker thread, pages are classified
+    with the last copy of it published by the worker. The cluster found
+    for a url pattern is kept in an LRU cache of `cache_size` patterns
+    that is cleared each time a new copy is published.
+
+    Pages are classified in the calling thread as extraction needs their
+    cluster right away, only fitting is done by the worker.
+    """
+    def __init__(self, clustering, queue_size=1000, refit_interval=5.0,
+                 cache_size=10000, stats=None):
+        if not isinstance(clustering.vectorizer, FeaturesVectorizer):
+            clustering.vectorizer = FeaturesVectorizer(clustering.vectorizer)
+        self.clustering = clustering
+        self.refit_interval = refit_interval
+        self.cache_size = cache_size
+        self.stats = stats
+        self.queue = queue.Queue(queue_size)
+        self.model = self._snapshot() if clustering.is_fit else None
+        self._clusters = OrderedDict()
+        self._model_for_clusters = self.model
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls, clustering, settings):
+        return cls(clustering,
+                   settings.getint('CLUSTERING_QUEUE_SIZE', 1000),
+                   settings.getfloat('CLUSTERING_REFIT_INTERVAL', 5.0),
+                   settings.getint('CLUSTERING_URL_CACHE_SIZE', 10000))
+
+    @property
+    def vectorizer(self):
+        return self.clustering.vectorizer
+
+    @vectorizer.setter
+    def vectorizer(self, vectorizer):
+        self.clustering.vectorizer = vectorizer
+
+    @property
+    def is_fit(self):
+        return self.model is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='page-clustering')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def close(self, *args, **kwargs):
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def add_page(self, page, block=True):
+        """Send a page to the worker to be added to the model
+
+        If `block` is False the page is dropped when the queue is full.
+        """
+        if not isinstance(page, PageFeatures):
+            page = PageFeatures.from_page(page)
+        self.start()
+        try:
+            self.queue.put(page, block)
+        except queue.Full:
+            self._inc_stats('clustering/pages_dropped')
+
+    def classify(self, page, url=None):
+        """Return the cluster of the page, -1 for outliers and None if the
+        model is not fit yet"""
+        model = self.model
+        if model is None:
+            return None
+        if model is not self._model_for_clusters:
+            self._clusters.clear()
+            self._model_for_clusters = model
+        pattern = url_pattern(url) if url else None
+        if pattern is not None:
+            try:
+                cluster = self._clusters.pop(pattern)
+            except KeyError:
+                pass
+            else:
+                self._clusters[pattern] = cluster
+                self._inc_stats('clustering/url_cache_hits')
+                return cluster
+        if not isinstance(page, PageFeatures):
+            page = PageFeatures.from_page(page)
+        cluster = model.classify(page)
+        if pattern is not None:
+            self._clusters[pattern] = cluster
+            while len(self._clusters) > self.cache_size:
+                self._clusters.popitem(last=False)
+        return cluster
+
+    def _snapshot(self):
+        model = copy.deepcopy(self.clustering)
+        model.batch = []
+        model.vectorizer = FeaturesVectorizer(model.vectorizer.vectorizer,
+                                              read_only=True)
+        return model
+
+    def _run(self):
+        changed = False
+        published = time.time()
+        while True:
+            timeout = max(published + self.refit_interval - time.time(), 0)
+            try:
+                page = self.queue.get(timeout=timeout if changed else None)
+            except queue.Empty:
+                page = None
+            if page is _STOP:
+                break
+            if page is not None:
+                try:
+                    self.clustering.add_page(page)
+                    changed = self.clustering.is_fit
+                except Exception:
+                    logger.exception('Page could not be clustered')
+            if changed and time.time() - published >= self.refit_interval:
+                self.model = self._snapshot()
+                self._inc_stats('clustering/models_published')
+                published, changed = time.time(), False
+
+    def _inc_stats(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(key)
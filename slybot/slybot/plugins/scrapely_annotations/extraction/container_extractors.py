@@ -5,7 +5,10 @@ from collections import defaultdict
 from cStringIO import StringIO
 from itertools import groupby
 
+import numpy as np
+
 from numpy import array
+from numpy.lib.stride_tricks import as_strided
 from six.moves import xrange
 
 from scrapely.extraction.pageobjects import AnnotationTag
@@ -14,12 +17,14 @@ from scrapely.extraction.regionextract import (
     AdjacentVariantExtractor
 )
 from scrapely.extraction.similarity import (
-    similar_region, longest_unique_subsequence, first_longest_subsequence
+    longest_unique_subsequence, first_longest_subsequence
 )
 from scrapely.htmlpage import HtmlTagType
 from scrapy.utils.spider import arg_to_iter
 
-from .region_extractors import SlybotRecordExtractor, BaseExtractor
+from .region_extractors import (
+    SlybotRecordExtractor, BaseExtractor, similar_page_region
+)
 from .utils import container_id, group_tree, Region, element_from_page_index
 from ..processors import MissingRequiredError, ItemProcessor
 
@@ -30,6 +35,91 @@ MIN_JUMP_DISTANCE = 0.7
 MAX_RELATIVE_SEPARATOR_MULTIPLIER = 0.7
 
 
+def _matches_at(tokens, pattern, index):
+    """
+    Check if the pattern starts at index.
+
+    Near the end of the tokens a single remaining token is broadcast against
+    the pattern and other lengths that differ from the pattern do not match.
+    """
+    window = tokens[index:index + len(pattern)]
+    if len(window) != len(pattern) and 1 not in (len(window), len(pattern)):
+        return False
+    return (window == pattern).all()
+
+
+def _pattern_matches(tokens, pattern, start, end):
+    """
+    Find which positions from start to end (inclusive) the pattern starts at.
+
+    Gives the same result as calling `_matches_at` for every position.
+    """
+    size = max(end - start + 1, 0)
+    pattern_length = len(pattern)
+    matches = np.ones(size, dtype=bool)
+    if not pattern_length or not size:
+        return matches
+    full_windows = max(min(end, len(tokens) - pattern_length) - start + 1, 0)
+    if full_windows:
+        step = tokens.strides[0]
+        windows = as_strided(tokens[start:], strides=(step, step),
+                             shape=(full_windows, pattern_length))
+        matches[:full_windows] = (windows == pattern).all(axis=1)
+    for offset in xrange(full_windows, size):
+        matches[offset] = _matches_at(tokens, pattern, start + offset)
+    return matches
+
+
+class _RegionBoundaries(object):
+    """
+    Positions where a repeated container prefix or suffix starts in a page.
+
+    All positions between start and end are matched at once so that regions
+    can be found by searching the sorted match positions.
+    """
+    def __init__(self, tokens, prefix, suffix, start, end):
+        self.tokens = np.asarray(tokens)
+        self.prefix, self.suffix = prefix, suffix
+        self.start, self.end = start, end
+        self.prefix_matches = _pattern_matches(self.tokens, prefix, start, end)
+        self.suffix_matches = _pattern_matches(self.tokens, suffix, start, end)
+        self.prefix_starts = np.flatnonzero(self.prefix_matches) + start
+        self.boundaries = np.flatnonzero(
+            self.prefix_matches | self.suffix_matches) + start
+
+    def next_prefix(self, index, max_index):
+        """First position from index to max_index matching the prefix"""
+        position = self.prefix_starts.searchsorted(index)
+        if position < len(self.prefix_starts):
+            index = int(self.prefix_starts[position])
+            if index <= max_index:
+                return index
+        return None
+
+    def next_boundary(self, index):
+        """
+        First position from index where the next prefix or a suffix starts or
+        where a suffix would reach the end.
+
+        Returns the position and if the prefix starts there.
+        """
+        suffix_end = self.end - len(self.suffix)
+        # Positions before the matched range are rare so compare them directly
+        for peek in xrange(index, min(self.start, self.end + 1)):
+            matches_prefix = _matches_at(self.tokens, self.prefix, peek)
+            if (matches_prefix or peek >= suffix_end or
+                    _matches_at(self.tokens, self.suffix, peek)):
+                return peek, matches_prefix
+        index = max(index, self.start)
+        peek = max(index, suffix_end)
+        position = self.boundaries.searchsorted(index)
+        if position < len(self.boundaries):
+            peek = min(peek, int(self.boundaries[position]))
+        if peek > self.end:
+            return None
+        return peek, self.prefix_matches[peek - self.start]
+
+
 class BaseContainerExtractor(object):
     _extractor_classes = [
         RepeatedDataExtractor,
@@ -275,8 +365,8 @@ class ContainerExtractor(BaseContainerExtractor, BasicTypeExtractor):
             end_index = max_end_index
         else:
             end_index = min(max_end_index, end_index + 1)
-        region = Region(*similar_region(
-            page.page_tokens, self.template_tokens, self.annotation,
+        region = Region(*similar_page_region(
+            page, self.template_tokens, self.annotation,
             start_index, end_index, self.best_match, **kwargs))
         if region.score < 1:
             return []
@@ -373,37 +463,35 @@ class RepeatedContainerExtractor(BaseContainerExtractor, RecordExtractor):
         max_start_index = max_index - prefixlen
         extracted = []
         surrounding_tag = element_from_page_index(page, start_index)
+        boundaries = _RegionBoundaries(page.page_tokens, self.prefix,
+                                       self.suffix, index, max_index)
         while index <= max_start_index:
+            index = boundaries.next_prefix(index, max_start_index)
+            if index is None:
+                break
             prefix_end = index + prefixlen
-            if (page.page_tokens[index:prefix_end] == self.prefix).all():
-                for peek in xrange(prefix_end + self.min_jump, max_index + 1):
-                    next_prefix = page.page_tokens[peek:peek + prefixlen]
-                    next_suffix = page.page_tokens[peek:peek + suffixlen]
-                    matches_next_prefix = (next_prefix == self.prefix).all()
-                    matches_next_suffix = (next_suffix == self.suffix).all()
-                    if not (matches_next_suffix or matches_next_prefix or
-                            peek + suffixlen >= max_index):
-                        continue
-                    if matches_next_prefix:
-                        peek -= suffixlen + 1
-                    try:
-                        items = []
-                        _index = index
-                        for extractor in self.extractors:
-                            items += extractor.extract(
-                                page, index, peek + self.offset,
-                                ignored_regions,
-                                suffix_max_length=suffixlen)
-                            _index = max(peek, index) - 1
-                    except MissingRequiredError:
-                        pass
-                    else:
-                        tag = element_from_page_index(page, index)
-                        processed = self._process_items(items, page, tag,
-                                                        surrounding_tag)
-                        extracted.extend(processed)
-                    index = _index
-                    break
+            boundary = boundaries.next_boundary(prefix_end + self.min_jump)
+            if boundary is not None:
+                peek, matches_next_prefix = boundary
+                if matches_next_prefix:
+                    peek -= suffixlen + 1
+                try:
+                    items = []
+                    _index = index
+                    for extractor in self.extractors:
+                        items += extractor.extract(
+                            page, index, peek + self.offset,
+                            ignored_regions,
+                            suffix_max_length=suffixlen)
+                        _index = max(peek, index) - 1
+                except MissingRequiredError:
+                    pass
+                else:
+                    tag = element_from_page_index(page, index)
+                    processed = self._process_items(items, page, tag,
+                                                    surrounding_tag)
+                    extracted.extend(processed)
+                index = _index
             index += 1
         result = []
         for i, item in enumerate(extracted, 1):
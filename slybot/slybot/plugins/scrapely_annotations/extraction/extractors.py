@@ -8,8 +8,9 @@ from scrapy.selector import Selector
 from scrapy.utils.spider import arg_to_iter
 
 from .container_extractors import BaseContainerExtractor, ContainerExtractor
-from .pageparsing import parse_template
-from .region_extractors import BaseExtractor
+from .pageparsing import parse_template, SlybotTemplatePage
+from .region_extractors import BaseExtractor, RegionMatchingPage
+from .template_index import TemplateIndex
 from .utils import _count_annotations
 from ..processors import ItemProcessor
 
@@ -17,6 +18,8 @@ from ..processors import ItemProcessor
 class TemplatePageMultiItemExtractor(TemplatePageExtractor):
     def extract(self, page, start_index=0, end_index=None):
         items = []
+        # Extractors often match the same regions so share the matches
+        page = RegionMatchingPage(page)
         for extractor in self.extractors:
             extracted = extractor.extract(page, start_index, end_index,
                                           self.template.ignored_regions)
@@ -33,16 +36,11 @@ class SlybotIBLExtractor(InstanceBasedLearningExtractor):
     tree_order_func = _count_annotations
 
     def __init__(self, template_descriptor_pairs, trace=False,
-                 apply_extrarequired=True):
-        self.token_dict = TokenDict()
-        parsed_templates = []
-        template_versions = []
-        for template, descriptors, version in template_descriptor_pairs:
-            parsed = parse_template(self.token_dict, template, descriptors)
-            parsed_templates.append(parsed)
-            template_versions.append(version)
-            if _annotation_count(parsed):
-                parse_extraction_page(self.token_dict, template)
+                 apply_extrarequired=True, candidates=None,
+                 template_cache=None):
+        parsed_templates = self._parse_templates(template_descriptor_pairs,
+                                                 template_cache)
+        template_versions = [v for _, _, v in template_descriptor_pairs]
 
         for parsed in parsed_templates:
             default_schema = getattr(parsed, '_default_schema', None)
@@ -60,6 +58,46 @@ class SlybotIBLExtractor(InstanceBasedLearningExtractor):
             self.build_extraction_tree(p, None, trace)
             for p, v in zip(parsed_templates, template_versions)
         ]
+        # Only worth indexing if some templates can be skipped
+        self.template_index = None
+        if candidates and len(parsed_templates) > candidates:
+            self.template_index = TemplateIndex(parsed_templates, candidates)
+
+    def _parse_templates(self, template_descriptor_pairs,
+                         template_cache=None):
+        """Parse all templates sharing a single token dict.
+
+        If a template cache is provided the parsed templates are loaded from
+        it when the same templates have been parsed before.
+        """
+        if template_cache is not None:
+            key = template_cache.key(
+                'parsed', [(template.page_id, template.body)
+                           for template, _, _ in template_descriptor_pairs])
+            cached = template_cache.get(key)
+            if cached is not None:
+                self.token_dict, parsed_data = cached
+                return [
+                    SlybotTemplatePage(template, self.token_dict, tokens,
+                                       annotations, template.page_id,
+                                       ignored, extra_required,
+                                       descriptors or {})
+                    for (template, descriptors, _), (
+                        tokens, annotations, ignored, extra_required)
+                    in zip(template_descriptor_pairs, parsed_data)
+                ]
+        self.token_dict = TokenDict()
+        parsed_templates = []
+        for template, descriptors, version in template_descriptor_pairs:
+            parsed = parse_template(self.token_dict, template, descriptors)
+            parsed_templates.append(parsed)
+            if _annotation_count(parsed):
+                parse_extraction_page(self.token_dict, template)
+        if template_cache is not None:
+            template_cache.set(key, (self.token_dict, [
+                (p.page_tokens, p.annotations, p.ignored_regions,
+                 p.extra_required_attrs) for p in parsed_templates]))
+        return parsed_templates
 
     def build_extraction_tree(self, template, type_descriptor=None,
                               trace=False):
@@ -89,15 +127,23 @@ class SlybotIBLExtractor(InstanceBasedLearningExtractor):
         """Extract data from an html page.
 
         If pref_template_url is specified, the template with that url will be
-        used first.
+        used first. If there is a template index the most similar templates
+        are tried before the others.
         """
-        extraction_page = parse_extraction_page(self.token_dict, html)
+        if hasattr(html, 'extraction_page'):
+            extraction_page = html.extraction_page(self.token_dict)
+            sel = html.selector
+        else:
+            extraction_page = parse_extraction_page(self.token_dict, html)
+            sel = Selector(text=html.body)
         extraction_trees = self.extraction_trees
+        if self.template_index is not None:
+            extraction_trees = self.template_index.order(
+                extraction_trees, extraction_page.page_tokens)
         if pref_template_id is not None:
             extraction_trees = sorted(
-                self.extraction_trees,
+                extraction_trees,
                 key=lambda x: x.template.id != pref_template_id)
-        sel = Selector(text=html.body)
         for extraction_tree in extraction_trees:
             template_id = extraction_tree.template.id
             extracted = extraction_tree.extract(extraction_page)
@@ -1,6 +1,8 @@
 from itertools import chain
 
-from scrapely.extraction.pageobjects import AnnotationTag, PageRegion
+from scrapely.extraction.pageobjects import (
+    AnnotationTag, ExtractionPage, PageRegion
+)
 from scrapely.extraction.regionextract import (
     RecordExtractor, BasicTypeExtractor, TextRegionDataExtractor,
     labelled_element
@@ -11,6 +13,38 @@ from .utils import _int_cmp
 from ..exceptions import MissingRequiredError
 
 
+class RegionMatchingPage(ExtractionPage):
+    """Extraction page that remembers the regions matched in it"""
+    __slots__ = ('region_matches',)
+
+    def __init__(self, page):
+        super(RegionMatchingPage, self).__init__(
+            page.htmlpage, page.token_dict, page.page_tokens,
+            page.token_page_indexes)
+        self.region_matches = {}
+
+
+def similar_page_region(page, template_tokens, labelled, start_index,
+                        end_index, best_match, **kwargs):
+    """Call similar_region reusing earlier matches of the same page region.
+
+    Matches are only remembered for a `RegionMatchingPage`.
+    """
+    matches = getattr(page, 'region_matches', None)
+    if matches is None:
+        return similar_region(page.page_tokens, template_tokens, labelled,
+                              start_index, end_index, best_match, **kwargs)
+    key = (id(template_tokens), id(labelled), start_index, end_index,
+           best_match, tuple(sorted(kwargs.items())))
+    try:
+        return matches[key]
+    except KeyError:
+        region = similar_region(page.page_tokens, template_tokens, labelled,
+                                start_index, end_index, best_match, **kwargs)
+        matches[key] = region
+        return region
+
+
 class BaseExtractor(BasicTypeExtractor):
     def __init__(self, annotation, attribute_descriptors=None):
         self.annotation = annotation
@@ -93,13 +127,13 @@ class SlybotRecordExtractor(RecordExtractor):
         start_region = None if start_index is None else start_index - 1
         labelled = lelem(first_extractor)
         try:
-            score, pindex, sindex = similar_region(
-                page.page_tokens, self.template_tokens, labelled, start_region,
+            score, pindex, sindex = similar_page_region(
+                page, self.template_tokens, labelled, start_region,
                 end_region, self.best_match, **kwargs)
         except IndexError:
             start_region, end_region = start_index, end_index
-            score, pindex, sindex = similar_region(
-                page.page_tokens, self.template_tokens, labelled, start_region,
+            score, pindex, sindex = similar_page_region(
+                page, self.template_tokens, labelled, start_region,
                 end_region, self.best_match, **kwargs)
 
         if score > 0:
@@ -107,8 +141,8 @@ class SlybotRecordExtractor(RecordExtractor):
                 similar_ignored_regions = []
                 start = pindex
                 for i in ignored_regions:
-                    s, p, e = similar_region(
-                        page.page_tokens, self.template_tokens, i, start,
+                    s, p, e = similar_page_region(
+                        page, self.template_tokens, i, start,
                         sindex, self.best_match, **kwargs)
                     if s > 0:
                         similar_ignored_regions.append(PageRegion(p, e))
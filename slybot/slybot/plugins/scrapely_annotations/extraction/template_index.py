@@ -0,0 +1,67 @@
+"""
+Structural fingerprints for finding the templates most likely to match a page
+"""
+import numpy as np
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+_PRIME = (1 << 31) - 1
+_SHINGLE_MULTIPLIER = 1000003
+
+
+class TemplateIndex(object):
+    """Rank templates by how similar their tag structure is to a page.
+
+    Each template is fingerprinted with a minhash signature over shingles of
+    its token ids. At extraction time the page signature is compared against
+    every template signature at once and the `candidates` most similar
+    templates are tried before the others.
+    """
+    def __init__(self, templates, candidates=5, shingle_size=SHINGLE_SIZE,
+                 num_permutations=NUM_PERMUTATIONS, seed=0):
+        random_state = np.random.RandomState(seed)
+        self._a = random_state.randint(1, _PRIME, num_permutations).astype(
+            np.int64)
+        self._b = random_state.randint(0, _PRIME, num_permutations).astype(
+            np.int64)
+        self.candidates = candidates
+        self.shingle_size = shingle_size
+        self.signatures = np.array([self.signature(t.page_tokens)
+                                    for t in templates])
+
+    def shingles(self, tokens):
+        """Hashes of every run of `shingle_size` consecutive tokens"""
+        tokens = np.asarray(tokens, dtype=np.int64)
+        size = min(self.shingle_size, len(tokens))
+        if size == 0:
+            return tokens
+        length = len(tokens) - size + 1
+        hashed = np.zeros(length, dtype=np.int64)
+        for offset in range(size):
+            window = tokens[offset:offset + length]
+            hashed = hashed * _SHINGLE_MULTIPLIER + window
+        return np.unique(hashed % _PRIME)
+
+    def signature(self, tokens):
+        shingles = self.shingles(tokens)
+        if not len(shingles):
+            return np.full(len(self._a), _PRIME, dtype=np.int64)
+        hashed = (np.outer(self._a, shingles) + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1)
+
+    def rank(self, tokens):
+        """Indexes of the templates most similar to the given page tokens"""
+        scores = (self.signatures == self.signature(tokens)).mean(axis=1)
+        ranked = np.argsort(-scores, kind='mergesort')
+        return ranked[:self.candidates]
+
+    def order(self, extraction_trees, tokens):
+        """Move the best candidates to the front keeping their relative order
+
+        The remaining trees are kept after the candidates so that the full scan
+        is still done when none of the candidates match.
+        """
+        best = set(self.rank(tokens).tolist())
+        candidates = [t for i, t in enumerate(extraction_trees) if i in best]
+        others = [t for i, t in enumerate(extraction_trees) if i not in best]
+        return candidates + others
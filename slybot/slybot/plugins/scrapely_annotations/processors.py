@@ -209,9 +209,13 @@ class ItemProcessor(object):
                     getattr(selector, mode)(query), parents, containers)
             except ValueError:
                 continue
-            for elem in elems:
-                elem._root.attrib.pop('data-tagid', None)
+            # The page tree is shared by all items so tagids must be restored
+            tagids = [(elem._root, elem._root.attrib.pop('data-tagid', None))
+                      for elem in elems]
             extracted = elems.xpath(self.attribute_query(a)).extract()
+            for root, tagid in tagids:
+                if tagid is not None:
+                    root.set('data-tagid', tagid)
             value = list(map(six.text_type.strip, extracted))
             if value:
                 aid = a.get(u'id') or i
@@ -454,7 +458,12 @@ class ItemField(object):
                 value = self.extractor.extractor(value)
             if value:
                 values.append(value)
-        if hasattr(self.extractor, u'adapt'):
+        if hasattr(self.extractor, u'adapt_many'):
+            values = self.extractor.adapt_many(
+                [x for x in values
+                 if x and not isinstance(x, (dict, ItemProcessor))],
+                self.htmlpage)
+        elif hasattr(self.extractor, u'adapt'):
             values = [self.extractor.adapt(x, self.htmlpage) for x in values
                       if x and not isinstance(x, (dict, ItemProcessor))]
         else:
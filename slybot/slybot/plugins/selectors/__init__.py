@@ -1,31 +1,101 @@
+import re
+
+import six
+
+from cssselect import SelectorError
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+from slybot.utils import htmlpage_from_response
+
+_TAGID_RE = re.compile(r'\s+data-tagid="\d+"')
+_NAMESPACES = {'re': 'http://exslt.org/regular-expressions',
+               'set': 'http://exslt.org/sets'}
+_TEXT = etree.XPath('./text()', smart_strings=False)
+
+
+def _compile(selector_data):
+    """Compiled XPath for the selector, None if its type is unknown
+
+    CSS selectors are translated to XPath once so every response only has to
+    evaluate them.
+    """
+    selector = selector_data['selector']
+    selector_type = selector_data['type']
+    if selector_type == 'css':
+        selector = HTMLTranslator().css_to_xpath(selector)
+    elif selector_type != 'xpath':
+        return None
+    return etree.XPath(selector, namespaces=_NAMESPACES, smart_strings=False)
+
+
+def _extract(value):
+    """Text of an XPath result as extracted by scrapy selectors"""
+    if isinstance(value, etree._Element):
+        return etree.tostring(value, method='html', encoding='unicode',
+                              with_tail=False)
+    if value is True:
+        return u'1'
+    if value is False:
+        return u'0'
+    return six.text_type(value)
+
 
 class Selectors(object):
     def setup_bot(self, settings, spec, items, extractors, logger):
         self.logger = logger
         self.selectors = {} # { template_id: { field_name: {..} }
+        self.compiled = {}  # { template_id: [(field_name, type, XPath)] }
 
         for template in spec['templates']:
             template_id = template.get('page_id')
-            self.selectors[template_id] = template.get('selectors', {})
+            selectors = template.get('selectors', {})
+            self.selectors[template_id] = selectors
+            compiled = []
+            for field, selector_data in selectors.items():
+                try:
+                    xpath = _compile(selector_data)
+                except (etree.XPathError, SelectorError) as e:
+                    self.logger.warning(
+                        'Invalid selector for field "%s" of template "%s": '
+                        '%s' % (field, template_id, e))
+                    continue
+                compiled.append((field, selector_data['type'], xpath))
+            self.compiled[template_id] = compiled
 
     def process_item(self, item, response):
         template_id = item.get('_template', '')
-        selectors = self.selectors.get(template_id)
-        if not selectors:
+        if not self.compiled.get(template_id):
             return
 
-        for field, selector_data in selectors.items():
-            selector = selector_data['selector']
-            selector_type = selector_data['type']
+        # Selectors give the same results for every item of the response
+        cache = response.__dict__.setdefault('_slybot_selectors', {})
+        try:
+            results = cache[template_id]
+        except KeyError:
+            results = cache[template_id] = self._select(template_id, response)
+        for field, result in results:
+            result = list(result)
+            item[field] = ([item[field]] + result) if field in item else result
 
-            if selector_type == 'css':
-                result = response.css(selector).xpath('./text()').extract()
-            elif selector_type == 'xpath':
-                result = response.xpath(selector).extract()
-            else:
+    def _select(self, template_id, response):
+        # Use the tree already parsed by the annotations plugin
+        root = htmlpage_from_response(response, _add_tagids=True).selector.root
+        results = []
+        for field, selector_type, xpath in self.compiled[template_id]:
+            if xpath is None:
                 msg = 'Selector type not implemented: {}'.format(selector_type)
                 raise Exception(msg)
-
-            item[field] = ([item[field]] + result) if field in item else result
+            found = xpath(root)
+            if not isinstance(found, list):
+                found = [found]
+            if selector_type == 'css':
+                result = [_extract(text) for element in found
+                          if isinstance(element, etree._Element)
+                          for text in _TEXT(element)]
+            else:
+                result = [_TAGID_RE.sub('', _extract(r)) for r in found]
+            results.append((field, result))
+        return results
 
 __all__ = [Selectors]
@@ -0,0 +1,73 @@
+"""
+Access to the files of a project
+
+Projects are read from a directory or straight from a zip archive. Paths are
+given as a sequence of names relative to the root of the project.
+"""
+import os
+import threading
+
+from zipfile import ZipFile
+
+
+class DirectoryFiles(object):
+    """Files of a project stored in a directory"""
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, parts):
+        return os.path.join(self.root, *parts)
+
+    def read(self, *parts):
+        with open(self._path(parts), 'rb') as f:
+            return f.read()
+
+    def listdir(self, *parts):
+        return os.listdir(self._path(parts))
+
+    def isdir(self, *parts):
+        return os.path.isdir(self._path(parts))
+
+
+class ZipFiles(object):
+    """Files of a project stored in a zip archive
+
+    Members are only decompressed when they are read. The archive can be
+    read from several threads.
+    """
+    def __init__(self, zipfile):
+        self.zipfile = ZipFile(zipfile)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._dirs = {}
+        for name in self.zipfile.namelist():
+            parts = [p for p in name.split('/') if p and p != '.']
+            path = '/'.join(parts)
+            if name.endswith('/'):
+                self._dirs.setdefault(path, set())
+            else:
+                self._files[path] = name
+            for i in range(len(parts)):
+                self._dirs.setdefault('/'.join(parts[:i]), set()).add(
+                    parts[i])
+
+    def read(self, *parts):
+        path = '/'.join(parts)
+        try:
+            name = self._files[path]
+        except KeyError:
+            raise IOError('No such file in %s: %s' % (self.zipfile.filename,
+                                                      path))
+        with self._lock:
+            return self.zipfile.read(name)
+
+    def listdir(self, *parts):
+        path = '/'.join(parts)
+        try:
+            return sorted(self._dirs[path])
+        except KeyError:
+            raise OSError('No such directory in %s: %s' % (
+                self.zipfile.filename, path))
+
+    def isdir(self, *parts):
+        return '/'.join(parts) in self._dirs
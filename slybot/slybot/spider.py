@@ -3,7 +3,7 @@ from __future__ import absolute_import
 import itertools
 import json
 
-from copy import deepcopy
+from copy import copy, deepcopy
 
 from loginform import fill_login_form
 
@@ -14,8 +14,13 @@ from scrapy.utils.spider import arg_to_iter
 import six
 from six.moves.urllib_parse import urlparse
 
+from slybot.bloomfilter import ScalableBloomFilter
+from slybot.dupefilter import splash_render_digest
+from slybot.extractionpool import ExtractionPool
 from slybot.generic_form import GenericForm
+from slybot.jsrendering import RenderStats
 from slybot.linkextractor import create_linkextractor_from_specs
+from slybot.splashscripts import splash_scripts
 from slybot.starturls import (
     FragmentGenerator, FeedGenerator, IdentityGenerator, StartUrlCollection,
     UrlGenerator
@@ -29,6 +34,36 @@ from w3lib.http import basic_auth_header
 STRING_KEYS = ['start_urls', 'exclude_patterns', 'follow_patterns',
                'allowed_domains', 'js_enabled', 'js_enable_patterns',
                'js_disable_patterns']
+START_URLS_POSITION = 'start_urls_position'
+# Download of a page with render on miss, either 'raw' or 'rendered'
+RENDER_ON_MISS = 'render_on_miss'
+
+
+def copy_spec(spec):
+    """Copy the parts of a spider spec changed while setting up a spider
+
+    Template bodies and other large values are shared with `spec`. Templates
+    are copied so they can be annotated, with their annotation data when it
+    still has to be applied. Init requests are small and copied entirely as
+    login requests consume them and form requests fill their fields.
+    """
+    spec = copy(spec)
+    if 'templates' in spec:
+        spec['templates'] = [_copy_template(t) for t in spec['templates']]
+    if 'init_requests' in spec:
+        spec['init_requests'] = deepcopy(spec['init_requests'])
+    return spec
+
+
+def _copy_template(template):
+    template = copy(template)
+    plugins = template.get('plugins')
+    if (plugins and 'annotations-plugin' in plugins and
+            not template.get('annotated')):
+        data = copy(plugins['annotations-plugin'])
+        data['extracts'] = deepcopy(data.get('extracts', []))
+        template['plugins'] = dict(plugins, **{'annotations-plugin': data})
+    return template
 
 
 class IblSpider(SitemapSpider):
@@ -44,7 +79,8 @@ class IblSpider(SitemapSpider):
         }
         self.generic_form = GenericForm(**kw)
         super(IblSpider, self).__init__(name, **kw)
-        spec = deepcopy(spec)
+        spider_args = (name, spec, item_schemas, all_extractors)
+        spec = copy_spec(spec)
         self._add_spider_args_to_spec(spec, kw)
         self.plugins = self._configure_plugins(
             settings, spec, item_schemas, all_extractors)
@@ -52,10 +88,15 @@ class IblSpider(SitemapSpider):
 
         self.login_requests, self.form_requests = [], []
         self._start_urls = self._create_start_urls(spec)
+        self._configure_start_urls(settings)
         self._start_requests = self._create_start_requests(spec)
         self._create_init_requests(spec)
         self._add_allowed_domains(spec)
         self.page_actions = spec.get('page_actions', [])
+        # Gzipped feeds are decompressed while their links are extracted
+        self.xml_streaming = settings.getbool('XML_LINKS_STREAMING')
+        self.extraction_pool = ExtractionPool.from_spider(
+            self, spider_args, kw, settings)
 
     def _add_spider_args_to_spec(self, spec, args):
         for key, val in args.items():
@@ -70,13 +111,30 @@ class IblSpider(SitemapSpider):
             self.start_url_generators,
         )
 
+    def _configure_start_urls(self, settings):
+        self.start_urls_shard = settings.getint('START_URLS_SHARD', 0)
+        self.start_urls_shards = settings.getint('START_URLS_SHARDS', 1)
+        self.start_urls_filter = None
+        if settings.getbool('START_URLS_DEDUPLICATE'):
+            self.start_urls_filter = ScalableBloomFilter(
+                settings.getfloat('START_URLS_FILTER_ERROR_RATE', 0.001))
+
     def _create_start_requests(self, spec):
         init_requests = spec.get('init_requests', [])
         for rdata in init_requests:
             if rdata["type"] == "start":
                 yield self._create_start_request_from_specs(rdata)
 
-        for start_url in self._start_urls:
+        # With a JOBDIR the position of the last start url is kept in the
+        # spider state so a resumed crawl continues after it
+        state = getattr(self, 'state', None)
+        start = state.get(START_URLS_POSITION, 0) if state is not None else 0
+        start_urls = self._start_urls.iter_indexed(
+            start, self.start_urls_shard, self.start_urls_shards,
+            self.start_urls_filter)
+        for position, start_url in start_urls:
+            if state is not None:
+                state[START_URLS_POSITION] = position + 1
             if not isinstance(start_url, Request):
                 start_url = Request(start_url, callback=self.parse,
                                     dont_filter=True)
@@ -110,7 +168,7 @@ class IblSpider(SitemapSpider):
                            callback=self.after_login, dont_filter=True)
 
     def after_login(self, response):
-        for result in self.parse(response):
+        for result in self.parse(response, _inline=True):
             yield result
         for req in self._start_requests:
             yield req
@@ -150,7 +208,7 @@ class IblSpider(SitemapSpider):
             yield req
 
     def after_form_page(self, response):
-        for result in self.parse(response):
+        for result in self.parse(response, _inline=True):
             yield result
 
     def _get_allowed_domains(self, spec):
@@ -186,7 +244,7 @@ class IblSpider(SitemapSpider):
         request = Request(url=url, callback=self.parse)
         return self._add_splash_meta(request)
 
-    def parse(self, response):
+    def parse(self, response, _inline=False):
         """Main handler for all downloaded responses"""
         request = response.request
         if (request and request.method == 'POST' and
@@ -196,10 +254,19 @@ class IblSpider(SitemapSpider):
                 response._url = url
         content_type = response.headers.get('Content-Type', '')
         if isinstance(response, HtmlResponse):
-            return self.handle_html(response)
+            if self.extraction_pool is not None and not _inline:
+                dfd = self.extraction_pool.extract(response)
+                return dfd.addCallback(
+                    lambda results: list(self._render_on_miss(
+                        self._process_results(
+                            self._filter_followed(results), response,
+                            items_processed=True),
+                        response)))
+            return self._render_on_miss(self.handle_html(response), response)
         if (isinstance(response, XmlResponse) or
                 response.url.endswith(('.xml', '.xml.gz'))):
-            response._set_body(self._get_sitemap_body(response))
+            if not self.xml_streaming:
+                response._set_body(self._get_sitemap_body(response))
             return self.handle_xml(response)
         self.logger.debug(
             "Ignoring page with content-type=%r: %s" % (content_type,
@@ -216,6 +283,10 @@ class IblSpider(SitemapSpider):
             plugins[plugin_name] = instance
         return plugins
 
+    def _set_crawler(self, crawler):
+        super(IblSpider, self)._set_crawler(crawler)
+        self._plugin_hook('setup_crawler', crawler)
+
     def _plugin_hook(self, name, *args):
         results = []
         for plugin in self.plugins.values():
@@ -225,21 +296,75 @@ class IblSpider(SitemapSpider):
 
     def _handle(self, hook, response, *extrasrgs):
         generators = self._plugin_hook(hook, response, *extrasrgs)
-        for item_or_request in itertools.chain(*generators):
+        return self._process_results(itertools.chain(*generators), response)
+
+    def _process_results(self, results, response, items_processed=False):
+        """Pass results to the plugins and add Splash options to requests
+
+        Items extracted in workers have been processed there already.
+        """
+        for item_or_request in results:
             if isinstance(item_or_request, Request):
                 self._plugin_hook('process_request', item_or_request, response)
-            else:
+            elif not items_processed:
                 self._plugin_hook('process_item', item_or_request, response)
             if isinstance(item_or_request, Request):
                 item_or_request = self._add_splash_meta(item_or_request)
             yield item_or_request
 
+    def _filter_followed(self, results):
+        """Drop requests for links followed before
+
+        Used for results extracted in workers, which do not share the link
+        filter of the spider.
+        """
+        for result in results:
+            if (isinstance(result, Request) and
+                    not all(self._plugin_hook('is_new_request', result))):
+                continue
+            yield result
+
+    def _render_on_miss(self, results, response):
+        """Render the page with Splash if no items were extracted from it
+
+        Items from templates requiring javascript are dropped from pages
+        downloaded without Splash, which are then rendered.
+        """
+        request = response.request
+        download = request.meta.get(RENDER_ON_MISS) if request else None
+        if download is None:
+            for result in results:
+                yield result
+            return
+        found_items = js_required = False
+        for result in results:
+            if not isinstance(result, Request):
+                if (download == 'raw' and
+                        result.get('_template') in self._js_templates):
+                    js_required = True
+                    continue
+                found_items = True
+            yield result
+        url = response.url
+        self.render_stats.record(url, download == 'rendered', found_items)
+        if download == 'raw' and (js_required or (
+                not found_items and self.render_stats.render_on_miss(url))):
+            self.logger.debug("Rendering page with no items: %s" % url)
+            request = request.replace(
+                url=url, dont_filter=True,
+                meta=dict(request.meta, **{RENDER_ON_MISS: 'rendered'}))
+            yield self._set_splash_meta(request)
+
     def handle_xml(self, response):
         return self._handle('handle_xml', response, set([]))
 
     def handle_html(self, response):
         return self._handle('handle_html', response)
 
+    def closed(self, reason):
+        if self.extraction_pool is not None:
+            self.extraction_pool.close()
+
     def _configure_js(self, spec, settings):
         self.js_enabled = False
         self.SPLASH_HOST = None
@@ -256,7 +381,24 @@ class IblSpider(SitemapSpider):
         self.splash_js_source = settings.get(
             'SPLASH_JS_SOURCE', 'function(){}')
         self.splash_lua_source = settings.get('SPLASH_LUA_SOURCE', '')
+        self.splash_scripts = {
+            'js_source': splash_scripts.register(self.splash_js_source),
+            'lua_source': splash_scripts.register(self.splash_lua_source),
+        }
+        # Render options are the same for all requests so the part of
+        # their fingerprints depending on them is only computed once
+        self.splash_fingerprint = splash_render_digest(
+            self._splash_options(''))
         self._filter_js_urls = self._build_js_url_filter(spec)
+        # Pages are first downloaded without Splash and only rendered when
+        # no items can be extracted from them
+        self.render_on_miss = (self.js_enabled and
+                               settings.getbool('SPLASH_RENDER_ON_MISS'))
+        self.render_stats = RenderStats(
+            settings.getint('SPLASH_RENDER_ON_MISS_MIN_PAGES', 10))
+        self._js_templates = frozenset(
+            t.get('page_id') for t in spec.get('templates', [])
+            if t.get('js_required'))
 
     def _build_js_url_filter(self, spec):
         if not self.js_enabled:
@@ -267,19 +409,33 @@ class IblSpider(SitemapSpider):
 
     def _add_splash_meta(self, request):
         if self.js_enabled and self._filter_js_urls(request.url):
-            cleaned_url = urlparse(request.url)._replace(params='', query='',
-                                                         fragment='').geturl()
-            endpoint = 'execute' if self.splash_lua_source else 'render.html'
-            request.meta['splash'] = {
-                'endpoint': endpoint,
-                'args': {
-                    'wait': self.splash_wait,
-                    'timeout': self.splash_timeout,
-                    'js_source': self.splash_js_source,
-                    'lua_source': self.splash_lua_source,
-                    'images': 0,
-                    'url': request.url,
-                    'baseurl': cleaned_url
-                }
-            }
+            if (self.render_on_miss and
+                    request.callback in (None, self.parse) and
+                    request.meta.get(RENDER_ON_MISS) != 'rendered' and
+                    not self.render_stats.needs_rendering(request.url)):
+                request.meta[RENDER_ON_MISS] = 'raw'
+                return request
+            return self._set_splash_meta(request)
         return request
+
+    def _set_splash_meta(self, request):
+        splash_options = self._splash_options(request.url)
+        splash_options['fingerprint'] = self.splash_fingerprint
+        request.meta['splash'] = splash_options
+        return request
+
+    def _splash_options(self, url):
+        cleaned_url = urlparse(url)._replace(params='', query='',
+                                             fragment='').geturl()
+        endpoint = 'execute' if self.splash_lua_source else 'render.html'
+        return {
+            'endpoint': endpoint,
+            'args': {
+                'wait': self.splash_wait,
+                'timeout': self.splash_timeout,
+                'images': 0,
+                'url': url,
+                'baseurl': cleaned_url
+            },
+            'scripts': dict(self.splash_scripts),
+        }
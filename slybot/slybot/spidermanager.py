@@ -1,20 +1,17 @@
 from __future__ import absolute_import
-import tempfile
-import shutil
-import atexit
 import logging
 
 import slybot
 
-from zipfile import ZipFile
-
 from zope.interface import implements
 from scrapy.interfaces import ISpiderManager
 from scrapy.utils.misc import load_object
 from scrapy.utils.project import get_project_settings
 
+from slybot.projectfiles import ZipFiles
 from slybot.spider import IblSpider
-from slybot.utils import open_project_from_dir, load_plugins
+from slybot.templatecache import TemplateCache
+from slybot.utils import open_project, open_project_from_dir, load_plugins
 
 
 class SlybotSpiderManager(object):
@@ -26,12 +23,17 @@ class SlybotSpiderManager(object):
         if settings is None:
             settings = get_project_settings()
         self.spider_cls = load_object(spider_cls) if spider_cls else IblSpider
-        self._specs = open_project_from_dir(datadir)
+        self._specs = self._open_project(
+            datadir, TemplateCache.from_settings(settings))
         settings = settings.copy()
         settings.frozen = False
         settings.set('LOADED_PLUGINS', load_plugins(settings))
         self.settings = settings
 
+    def _open_project(self, datadir, template_cache):
+        # Spiders are only loaded when they are used
+        return open_project_from_dir(datadir, template_cache, lazy=True)
+
     @classmethod
     def from_crawler(cls, crawler):
         # backwards compatibility with Scrapy < 0.25
@@ -76,13 +78,17 @@ class ZipfileSlybotSpiderManager(SlybotSpiderManager):
 
     def __init__(self, datadir, zipfile=None, spider_cls=None, settings=None,
                  **kwargs):
-        if zipfile:
-            datadir = tempfile.mkdtemp(prefix='slybot-')
-            ZipFile(zipfile).extractall(datadir)
-            atexit.register(shutil.rmtree, datadir)
+        self.zipfile = zipfile
         super(ZipfileSlybotSpiderManager, self).__init__(datadir, spider_cls,
                                                          settings=settings)
 
+    def _open_project(self, datadir, template_cache):
+        if not self.zipfile:
+            return super(ZipfileSlybotSpiderManager, self)._open_project(
+                datadir, template_cache)
+        # Project files are read from the archive when they are needed
+        return open_project(ZipFiles(self.zipfile), template_cache, lazy=True)
+
     @classmethod
     def from_settings(cls, settings):
         datadir = settings['PROJECT_DIR']
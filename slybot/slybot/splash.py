@@ -1,20 +1,69 @@
+from scrapy import signals
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
 from scrapyjs import SplashMiddleware
 import os
 
+from slybot.splashcache import RenderCache
+from slybot.splashscripts import script_hash, splash_scripts
+
 js_file = os.path.join(os.path.dirname(__file__), 'splash-script-combined.js')
 js_source = ""
 if os.path.exists(js_file):
     with open(js_file, 'r') as f:
         js_source = f.read()
+js_source_hash = script_hash(js_source)
 
 class SlybotJsMiddleware(SplashMiddleware):
+    cache = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = super(SlybotJsMiddleware, cls).from_crawler(crawler)
+        middleware.cache = RenderCache.from_settings(crawler.settings)
+        if middleware.cache is not None:
+            crawler.signals.connect(middleware.spider_closed,
+                                    signals.spider_closed)
+        return middleware
+
+    def spider_closed(self, spider):
+        self.cache.close()
+
     def process_request(self, request, spider):
         splash_opts = request.meta.get('splash')
-        if splash_opts and 'args' in splash_opts:
+        if (self.cache is not None and splash_opts and
+                not request.meta.get('_splash_processed')):
+            key = self.cache.key(splash_opts, js_source_hash)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.crawler.stats.inc_value('splash/cache/hit',
+                                             spider=spider)
+                return self._cached_response(request, *cached)
+            self.crawler.stats.inc_value('splash/cache/miss', spider=spider)
+            request.meta['_splash_cache_key'] = key
+        args = None
+        if (splash_opts and 'args' in splash_opts and
+                not request.meta.get('_splash_processed')):
+            # Script sources are only added to the body sent to Splash,
+            # the request keeps the hashes of its scripts
             args = splash_opts['args']
-            args['js_source'] = "%s;\n%s" % (js_source, args.get('js_source', ''))
-
-        req = super(SlybotJsMiddleware, self).process_request(request, spider)
+            wire_args = splash_scripts.expand(splash_opts)
+            wire_args['js_source'] = "%s;\n%s" % (
+                js_source, wire_args.get('js_source', ''))
+            splash_opts['args'] = wire_args
+        try:
+            req = super(SlybotJsMiddleware, self).process_request(
+                request, spider)
+        finally:
+            if args is not None:
+                if 'url' in wire_args:
+                    args.setdefault('url', wire_args['url'])
+                splash_opts['args'] = args
+        if req is not None:
+            # The original request already went through the duplicates
+            # filter, the request sent to Splash with the script sources is
+            # scheduled again and must not be hashed nor dropped
+            req.dont_filter = True
         splash_auth = getattr(spider, 'splash_auth', None)
         if splash_auth and 'Authorization' not in request.headers:
             request.headers['Authorization'] = splash_auth
@@ -27,4 +76,19 @@ class SlybotJsMiddleware(SplashMiddleware):
         if splash_options:
             url = splash_options['args'].get('url')
             response._set_url(url or response.url)
+            key = request.meta.get('_splash_cache_key')
+            if key and self.cache is not None and response.status == 200:
+                headers = {
+                    name.decode('latin-1'): [v.decode('latin-1')
+                                             for v in values]
+                    for name, values in response.headers.items()}
+                self.cache.set(key, response.url, headers, response.body)
+                self.crawler.stats.inc_value('splash/cache/store',
+                                             spider=spider)
         return response
+
+    def _cached_response(self, request, url, headers, body):
+        headers = Headers(headers)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, body=body, request=request,
+                       flags=['cached'])
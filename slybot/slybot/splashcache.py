@@ -0,0 +1,114 @@
+"""
+Persistent cache for pages rendered by Splash
+
+Rendered pages are stored in a sqlite database keyed by a hash of the url,
+the Splash endpoint and the render arguments. Scripts are part of the key by
+their hash only. Pages expire after `ttl` seconds and the oldest pages are
+dropped when there are more than `max_pages`. Stored pages are committed
+with each cleanup, every `cleanup_interval` stores and when the cache is
+closed.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from scrapy.utils.project import data_path
+
+from slybot.splashscripts import script_hash
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache(object):
+    # Stores between commits and checks for expired and extra pages
+    cleanup_interval = 100
+
+    def __init__(self, path, ttl=0, max_pages=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._stores = 0
+        directory = os.path.dirname(path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, '
+            'url TEXT, headers BLOB, body BLOB, stored REAL)')
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS pages_stored ON pages (stored)')
+        self.db.commit()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Return a cache if SPLASH_CACHE_ENABLED is set, None otherwise"""
+        if not settings or not settings.getbool('SPLASH_CACHE_ENABLED'):
+            return None
+        return cls(data_path(settings.get('SPLASH_CACHE_PATH',
+                                          'splash-cache.sqlite')),
+                   settings.getint('SPLASH_CACHE_TTL', 0),
+                   settings.getint('SPLASH_CACHE_MAX_PAGES', 10000))
+
+    @staticmethod
+    def key(splash_options, *extra):
+        """Hash of the render options of a request with scripts by hash"""
+        args = dict(splash_options.get('args', {}))
+        for name, key in splash_options.get('scripts', {}).items():
+            args[name] = key
+        for name in ('js_source', 'lua_source', 'slybot_actions_source'):
+            if name in args and name not in splash_options.get('scripts', {}):
+                args[name] = script_hash(args[name])
+        parts = [args.get('url'), splash_options.get('endpoint'), args]
+        parts.extend(extra)
+        return hashlib.sha1(
+            json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the url, headers and body of a page or None"""
+        row = self.db.execute(
+            'SELECT url, headers, body, stored FROM pages WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return None
+        url, headers, body, stored = row
+        if self.ttl and stored + self.ttl < time.time():
+            return None
+        return url, json.loads(bytes(headers).decode('utf-8')), bytes(body)
+
+    def set(self, key, url, headers, body):
+        headers = json.dumps(headers).encode('utf-8')
+        self.db.execute(
+            'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+            (key, url, sqlite3.Binary(headers), sqlite3.Binary(body),
+             time.time()))
+        self._stores += 1
+        if self._stores % self.cleanup_interval == 0:
+            self.cleanup()
+
+    def cleanup(self):
+        """Drop expired pages and the oldest pages above `max_pages`"""
+        if self.ttl:
+            self.db.execute('DELETE FROM pages WHERE stored < ?',
+                            (time.time() - self.ttl,))
+        if self.max_pages:
+            self.db.execute(
+                'DELETE FROM pages WHERE key IN (SELECT key FROM pages '
+                'ORDER BY stored DESC, rowid DESC LIMIT -1 OFFSET ?)',
+                (self.max_pages,))
+        self.db.commit()
+
+    def close(self):
+        try:
+            self.cleanup()
+        except sqlite3.Error as e:
+            logger.debug('Could not clean up Splash cache: %s', e)
+            self.db.commit()
+        self.db.close()
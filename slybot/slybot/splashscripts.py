@@ -0,0 +1,48 @@
+"""
+Scripts sent to Splash
+
+Requests refer to their scripts by the hash of their source in
+`meta['splash']['scripts']` so that the sources are not copied into every
+request. The sources are only added to the arguments sent to Splash.
+"""
+import hashlib
+import threading
+
+import six
+
+
+def script_hash(source):
+    if isinstance(source, six.text_type):
+        source = source.encode('utf-8')
+    return hashlib.sha1(source).hexdigest()
+
+
+class SplashScripts(object):
+    """Sources of the scripts used by requests, by their hash"""
+    def __init__(self):
+        self._scripts = {}
+        self._lock = threading.Lock()
+
+    def register(self, source):
+        """Store a script and return the key requests refer to it with"""
+        key = script_hash(source)
+        if key not in self._scripts:
+            with self._lock:
+                self._scripts.setdefault(key, source)
+        return key
+
+    def __getitem__(self, key):
+        return self._scripts[key]
+
+    def __contains__(self, key):
+        return key in self._scripts
+
+    def expand(self, splash_options):
+        """Splash arguments of a request with the sources of its scripts"""
+        args = dict(splash_options.get('args', {}))
+        for name, key in splash_options.get('scripts', {}).items():
+            args[name] = self[key]
+        return args
+
+
+splash_scripts = SplashScripts()
@@ -1,5 +1,7 @@
+import json
+
 from collections import OrderedDict as ODict
-from itertools import chain, product
+from itertools import chain, count, product
 
 from scrapy.utils.spider import arg_to_iter
 
@@ -18,10 +20,58 @@ class StartUrlCollection(object):
         self.start_urls = [self._from_type(url) for url in start_urls]
 
     def __iter__(self):
-        generated = (self._generate_urls(url) for url in self.start_urls)
-        for url in chain(*(arg_to_iter(g) for g in generated)):
+        for _, url in self.iter_indexed():
             yield url
 
+    def iter_indexed(self, start=0, shard=0, shards=1, url_filter=None):
+        """Generate (position, url) pairs lazily
+
+        Positions before `start` are skipped and only the positions equal to
+        `shard` modulo `shards` are generated, so a crawl can be resumed and
+        the urls split between several processes. Generators with a `count`
+        method build the urls at these positions directly, without going
+        through the skipped ones. With a `url_filter`, start urls with the
+        same key are only generated once and urls already added to the
+        filter are skipped.
+        """
+        first = start + (shard - start) % shards
+        position = 0
+        for start_url in self._start_urls(url_filter is not None):
+            generator = self.generators[start_url.generator_type]
+            value = start_url.generator_value
+            offset = first - position
+            if offset < 0:
+                offset %= shards
+            if hasattr(generator, 'count'):
+                size = generator.count(value)
+                urls = generator(value, offset, shards)
+            else:
+                # Other generators build a single url or request
+                urls = list(arg_to_iter(self._generate_urls(start_url)))
+                size = len(urls)
+                urls = urls[offset::shards]
+            positions = count(position + offset, shards)
+            for url_position, url in six.moves.zip(positions, urls):
+                if (url_filter is not None and
+                        isinstance(url, six.string_types) and
+                        not url_filter.add(url)):
+                    continue
+                yield url_position, url
+            position += size
+
+    def _start_urls(self, deduplicate=False):
+        if not deduplicate:
+            return self.start_urls
+        start_urls, seen = [], set()
+        for start_url in self.start_urls:
+            key = start_url.key
+            if not isinstance(key, six.string_types):
+                key = json.dumps(key, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                start_urls.append(start_url)
+        return start_urls
+
     def uniq(self):
         return list(ODict([(s.key, s.spec) for s in self.start_urls]).values())
 
@@ -69,6 +119,8 @@ class StartUrl(object):
         return self.spec
 
     def _find_fragment_domains(self):
+        # Fragments are only joined up to the one ending the domain, the
+        # fragments of the paths are never expanded
         generator = self.generators[self.generator_type]
         fragment_lists = generator.process_fragments(self.spec)
 
@@ -1,8 +1,9 @@
 from datetime import datetime
-from itertools import product
 
 import six
 
+from .generator import MappedSequence, iter_product, product_size
+
 
 class FragmentGenerator(object):
     def _process_fixed(self, fragment):
@@ -20,19 +21,24 @@ class FragmentGenerator(object):
 
         if a.isalpha() and b.isalpha():
             a, b = [ord(w.lower()) for w in [a, b]]
-            return (chr(w) for w in six.moves.range(a, b + 1))
+            return MappedSequence(six.moves.range(a, b + 1), chr)
         else:
             a, b = int(a), int(b)
-            return (str(i) for i in six.moves.range(a, b + 1))
+            return MappedSequence(six.moves.range(a, b + 1), str)
 
     def _process_fragment(self, fragment):
         processor = getattr(self, '_process_{}'.format(fragment['type']))
         return processor(fragment['value'])
 
     def process_fragments(self, spec):
-        return map(self._process_fragment, spec['fragments'])
+        return [self._process_fragment(fragment)
+                for fragment in spec['fragments']]
+
+    def count(self, spec):
+        """Number of urls generated for a spec"""
+        return product_size(self.process_fragments(spec))
 
-    def __call__(self, spec):
-        generated = product(*self.process_fragments(spec))
+    def __call__(self, spec, start=0, step=1):
+        generated = iter_product(self.process_fragments(spec), start, step)
         for fragment_list in generated:
             yield ''.join(fragment_list)
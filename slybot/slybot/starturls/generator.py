@@ -1,18 +1,55 @@
 from collections import OrderedDict
 from datetime import datetime
-from itertools import chain, product
+from itertools import chain
 
 from scrapy.utils.spider import arg_to_iter
 
 import six
-
-try:
-    from itertools import izip_longest
-except ImportError:
-    from itertools import zip_longest as izip_longest
 from six.moves.urllib.parse import urlencode
 
 
+class MappedSequence(object):
+    """Values of a sequence converted when they are accessed"""
+    def __init__(self, values, convert):
+        self.values = values
+        self.convert = convert
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.convert(self.values[index])
+
+    def __iter__(self):
+        return (self.convert(value) for value in self.values)
+
+
+def product_size(sequences):
+    size = 1
+    for values in sequences:
+        size *= len(values)
+    return size
+
+
+def iter_product(sequences, start=0, step=1):
+    """Generate the tuples of itertools.product from the `start`th one every
+    `step`
+
+    Tuples are built from their position so skipped tuples are not generated
+    and the sequences are not copied.
+    """
+    index, size = start, product_size(sequences)
+    while index < size:
+        values = []
+        position = index
+        for sequence in reversed(sequences):
+            position, value_index = divmod(position, len(sequence))
+            values.append(sequence[value_index])
+        values.reverse()
+        yield tuple(values)
+        index += step
+
+
 class IdentityGenerator():
     def __call__(self, spec):
         return spec
@@ -73,14 +110,13 @@ class UrlGenerator(object):
             return processed
         if 'name' not in descriptor:
             return []
-        return izip_longest([], processed, fillvalue=descriptor['name'])
+        name = descriptor['name']
+        return MappedSequence(processed, lambda value: (name, value))
 
-    def _generate_urls(self, template, paths, params_template, params):
+    def _generate_urls(self, template, paths, params_template, params,
+                       start=0, step=1):
         path_length = len(paths)
-        if params and not paths:
-            components = product(*params)
-        else:
-            components = product(*chain(paths, params))
+        components = iter_product(list(chain(paths, params)), start, step)
         for values in components:
             url = template.format(*values[:path_length])
             params = values[path_length:]
@@ -93,12 +129,22 @@ class UrlGenerator(object):
             else:
                 yield url
 
-    def __call__(self, spec):
-        template = spec['template']
-        param = spec.get('params_template', {})
+    def _sections(self, spec):
         paths = [self._build_section(d) for d in spec.get('paths', [])]
         params = [self._build_section(d, True) for d in spec.get('params', [])]
-        url_generator = self._generate_urls(template, paths, param, params)
+        return paths, params
+
+    def count(self, spec):
+        """Number of urls generated for a spec"""
+        paths, params = self._sections(spec)
+        return product_size(paths + params)
+
+    def __call__(self, spec, start=0, step=1):
+        template = spec['template']
+        param = spec.get('params_template', {})
+        paths, params = self._sections(spec)
+        url_generator = self._generate_urls(template, paths, param, params,
+                                            start, step)
         return url_generator
 
 
@@ -0,0 +1,76 @@
+"""
+Persistent cache for compiled templates
+
+Building annotated samples and parsing templates is the most expensive part
+of starting a spider. The results are stored on disk keyed by a hash of
+everything used to build them so they are only rebuilt when those change.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from six.moves import cPickle as pickle
+from scrapy.utils.project import data_path
+
+import slybot
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCache(object):
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Return a cache if TEMPLATE_CACHE_ENABLED is set, None otherwise"""
+        if not settings or not settings.getbool('TEMPLATE_CACHE_ENABLED'):
+            return None
+        return cls(data_path(settings.get('TEMPLATE_CACHE_DIR',
+                                          'template-cache')))
+
+    @staticmethod
+    def key(*parts):
+        """Hash of the JSON serializable parts and the slybot version"""
+        digest = hashlib.sha1(slybot.__version__.encode('utf-8'))
+        for part in parts:
+            digest.update(json.dumps(part, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, ValueError,
+                pickle.UnpicklingError):
+            return None
+
+    def set(self, key, value):
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError) as e:
+            logger.debug('Could not cache compiled template %s: %s', key, e)
+            return
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Write to a temporary file first so readers never see partial data
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, self._path(key))
+
+    def get_or_build(self, key, build):
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.set(key, value)
+        return value
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
@@ -70,4 +70,13 @@ class TestApplyAnnotations(TestCase):
         page = HtmlPage(url, body=html)
         self.assertEqual(get_base_url(page), url)
 
-
+    def test_get_base_url_cached(self):
+        """Base url is found again when the page body changes"""
+        html = u'<html><head><base href="http://example.com/products/" />\
+<body></body></html>'
+        url = "http://example.com/products/p19.html"
+        page = HtmlPage(url, body=html)
+        self.assertEqual(get_base_url(page), "http://example.com/products/")
+        self.assertEqual(get_base_url(page), "http://example.com/products/")
+        page.body = u'<html><head><body></body></html>'
+        self.assertEqual(get_base_url(page), url)
@@ -0,0 +1,87 @@
+from unittest import TestCase
+from os.path import dirname
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+
+from slybot.bloomfilter import BloomFilter, ScalableBloomFilter
+from slybot.spidermanager import SlybotSpiderManager
+
+_PATH = dirname(__file__)
+
+
+class BloomFilterTest(TestCase):
+    def test_bloomfilter(self):
+        bloom = BloomFilter(1000, 0.01)
+        self.assertTrue(bloom.add(u'http://example.com/1'))
+        self.assertFalse(bloom.add(u'http://example.com/1'))
+        self.assertIn(u'http://example.com/1', bloom)
+        self.assertNotIn(u'http://example.com/2', bloom)
+        self.assertEqual(len(bloom), 1)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add('added-%s' % i)
+        false_positives = sum('missing-%s' % i in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_scalable_bloomfilter(self):
+        bloom = ScalableBloomFilter(0.01, initial_capacity=10)
+        keys = ['key-%s' % i for i in range(100)]
+        added = [bloom.add(key) for key in keys]
+        self.assertGreater(len(bloom.filters), 1)
+        self.assertGreater(sum(added), 90)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_max_memory(self):
+        bloom = ScalableBloomFilter(0.01, initial_capacity=10, max_memory=64)
+        for i in range(1000):
+            bloom.add('key-%s' % i)
+        self.assertLessEqual(bloom.size, 64)
+        self.assertNotIn('key-0', bloom)
+
+    def test_max_memory_below_one_filter(self):
+        bloom = ScalableBloomFilter(0.01, initial_capacity=1000, max_memory=64)
+        # The first filter holds fewer keys so it fits in max_memory
+        self.assertLessEqual(bloom.size, 64)
+        self.assertLess(bloom.filters[0].capacity, 1000)
+        for i in range(200):
+            bloom.add('key-%s' % i)
+            self.assertLessEqual(bloom.size, 64)
+        self.assertEqual(len(bloom.filters), 1)
+        self.assertIn('key-199', bloom)
+        # Without room for any filter the current one keeps taking keys
+        bloom = ScalableBloomFilter(0.01, initial_capacity=10, max_memory=0)
+        keys = ['key-%s' % i for i in range(20)]
+        for key in keys:
+            bloom.add(key)
+        self.assertEqual(len(bloom.filters), 1)
+        self.assertTrue(all(key in bloom for key in keys))
+
+
+class LinkFilterTest(TestCase):
+    def test_links_filtered_across_pages(self):
+        settings = Settings({'LINK_FILTER_ENABLED': True})
+        smanager = SlybotSpiderManager("%s/data/SampleProject" % _PATH,
+                                       settings=settings)
+        name = "seedsofchange"
+        spider = smanager.create(name)
+        template = smanager._specs["spiders"][name]["templates"][0]
+        response = HtmlResponse(url=template["url"],
+                                body=template["original_body"].encode('utf-8'))
+        requests = [r for r in spider.handle_html(response)
+                    if isinstance(r, Request)]
+        self.assertTrue(requests)
+        # Links are only filtered once their requests are scheduled
+        response = HtmlResponse(url=template["url"],
+                                body=template["original_body"].encode('utf-8'))
+        self.assertEqual([r.url for r in spider.handle_html(response)
+                          if isinstance(r, Request)],
+                         [r.url for r in requests])
+        for request in requests:
+            spider.plugins['Annotations'].request_scheduled(request, spider)
+        response = HtmlResponse(url=template["url"],
+                                body=template["original_body"].encode('utf-8'))
+        self.assertEqual([r for r in spider.handle_html(response)
+                          if isinstance(r, Request)], [])
@@ -0,0 +1,123 @@
+import json
+import os
+
+from unittest import TestCase
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from scrapely.htmlpage import HtmlPage
+from six.moves.queue import Queue
+from scrapy.spiders import Spider
+
+from slybot.clustering import (PersistentClusteringMiddleware, PageFeatures,
+                               FeaturesVectorizer)
+from slybot.plugins.scrapely_annotations.clustering import (
+    BackgroundClustering, url_pattern)
+
+html = (u'<html><body><div class="a b"><p>1</p><p>2</p></div>'
+        u'<div class="b a"></div><br/></body></html>')
+
+
+class TagFrequency(object):
+    def __init__(self):
+        self.dictionary = {}
+        self.dimension = 0
+
+
+class PersistentClusteringTest(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.addCleanup(rmtree, self.directory)
+        self.spider = Spider('example')
+        self.middleware = PersistentClusteringMiddleware(self.directory)
+        self.middleware.db = self.middleware.dbmodule.open(
+            os.path.join(self.directory, self.spider.name), 'c')
+
+    def test_features(self):
+        features = PageFeatures.from_page(HtmlPage(body=html))
+        self.assertEqual(features.counts, {u'html': 1, u'body': 1,
+                                           u'div a b': 2, u'p': 2, u'br': 1})
+        vectorizer = FeaturesVectorizer(TagFrequency())
+        vector = vectorizer(features)
+        self.assertEqual(vectorizer.dimension, 5)
+        self.assertEqual(
+            vector[vectorizer.vectorizer.dictionary[
+                (u'div', frozenset([u'a', u'b']))]], 2)
+        # Unknown tokens are ignored when classifying
+        read_only = FeaturesVectorizer(vectorizer.vectorizer, read_only=True)
+        vector = read_only(PageFeatures({u'html': 1, u'span': 3}))
+        self.assertEqual(len(vector), 5)
+        self.assertEqual(vectorizer.dimension, 5)
+
+    def test_store_features(self):
+        middleware = self.middleware
+        features = PageFeatures.from_page(HtmlPage(body=html))
+        middleware.db['page'] = middleware._encode(features)
+        middleware.db['old'] = json.dumps([html, 'utf-8'])
+        # The vocabulary is only stored when asked to
+        self.assertNotIn('_vocabulary', middleware.db)
+        middleware._save_vocabulary()
+        middleware._load_vocabulary()
+        self.assertEqual(middleware._decode(middleware.db['page']).counts,
+                         features.counts)
+        self.assertEqual(middleware._decode(middleware.db['old']),
+                         [html, 'utf-8'])
+
+        class Clustering(object):
+            pages = []
+            queue = Queue(1)
+
+            def add_page(self, page, block=True):
+                self.pages.append(page)
+        clustering = Clustering()
+        list(middleware._load_pages(clustering))
+        self.assertEqual([p.counts for p in clustering.pages],
+                         [features.counts, features.counts])
+
+        middleware.max_pages = 1
+        middleware._compact(self.spider)
+        self.assertEqual(middleware.stored_pages, 1)
+        self.assertEqual(len(middleware.db), 2)
+        middleware.db.close()
+
+
+class KMeans(object):
+    """Clustering that puts each page in a cluster by its number of tags"""
+    def __init__(self):
+        self.vectorizer = TagFrequency()
+        self.batch = []
+        self.pages = 0
+
+    @property
+    def is_fit(self):
+        return self.pages >= 2
+
+    def add_page(self, page):
+        self.vectorizer(page)
+        self.pages += 1
+
+    def classify(self, page):
+        return sum(page.counts.values()) % 2
+
+
+class BackgroundClusteringTest(TestCase):
+    def test_url_pattern(self):
+        self.assertEqual(url_pattern('http://example.com/p/12/a-3?b=1&a=2'),
+                         url_pattern('http://example.com/p/4/a-56?a=&b=3'))
+        self.assertNotEqual(url_pattern('http://example.com/p/1'),
+                            url_pattern('http://example.com/c/1'))
+
+    def test_classify_published_model(self):
+        clustering = BackgroundClustering(KMeans(), refit_interval=0)
+        page = HtmlPage(url='http://example.com/p/1', body=html)
+        self.assertIsNone(clustering.classify(page, page.url))
+        clustering.add_page(page)
+        clustering.add_page(page)
+        clustering.close()
+        self.assertTrue(clustering.is_fit)
+        self.assertEqual(clustering.classify(page, page.url), 1)
+        other = HtmlPage(url='http://example.com/p/2',
+                         body=u'<html><body></body></html>')
+        # Same url pattern, the cluster is not computed again
+        self.assertEqual(clustering.classify(other, other.url), 1)
+        self.assertEqual(clustering.classify(other), 0)
@@ -1,13 +1,23 @@
+import hashlib
+
 from unittest import TestCase
 from os.path import dirname
+from shutil import rmtree
+from tempfile import mkdtemp
 
-from scrapy.http import HtmlResponse
+from scrapy.http import HtmlResponse, Request
 from scrapy.settings import Settings
 from scrapy.item import DictItem
 from scrapy.exceptions import DropItem
+from scrapy.spiders import Spider
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.request import request_fingerprint
 
 from slybot.spidermanager import SlybotSpiderManager
-from slybot.dupefilter import DupeFilterPipeline
+from slybot.dupefilter import (DupeFilterPipeline, LruVersionStore,
+                               CompactVersionStore, DbmVersionStore,
+                               SplashAwareDupeFilter, splash_render_digest,
+                               splash_request_fingerprint)
 
 _PATH = dirname(__file__)
 
@@ -39,3 +49,107 @@ class DupeFilterTest(TestCase):
         self.assertEqual(item2, dupefilter.process_item(item2, spider))
 
         self.assertRaises(DropItem, dupefilter.process_item, item1, spider)
+
+
+class VersionStoreTest(TestCase):
+    versions = [hashlib.sha1(str(i).encode('utf-8')).digest()
+                for i in range(10)]
+
+    def check_store(self, store):
+        for i, version in enumerate(self.versions):
+            self.assertIsNone(store.get(version))
+            store.add(version, u'http://example.com/%s' % i)
+        for version in self.versions:
+            self.assertIsNotNone(store.get(version))
+
+    def test_lru_store(self):
+        store = LruVersionStore(5)
+        self.check_store(LruVersionStore(10))
+        for version in self.versions:
+            store.add(version, u'http://example.com')
+        self.assertIsNone(store.get(self.versions[0]))
+        self.assertEqual(store.get(self.versions[-1]), u'http://example.com')
+
+    def test_compact_store(self):
+        self.check_store(CompactVersionStore(1024, batch_size=3))
+        self.check_store(CompactVersionStore(32, batch_size=3))
+
+    def test_dbm_store(self):
+        directory = mkdtemp()
+        self.addCleanup(rmtree, directory)
+        spider = Spider('example')
+        store = DbmVersionStore(directory, batch_size=3)
+        store.open(spider)
+        self.check_store(store)
+        store.close()
+        store = DbmVersionStore(directory)
+        store.open(spider)
+        self.assertEqual(store.get(self.versions[1]), u'http://example.com/1')
+        store.close()
+        store = DbmVersionStore(directory, reset=True)
+        store.open(spider)
+        self.assertIsNone(store.get(self.versions[1]))
+        store.close()
+
+
+class SplashDupeFilterTest(TestCase):
+    def setUp(self):
+        settings = get_project_settings()
+        settings.set('SPLASH_URL', 'http://localhost:8050')
+        smanager = SlybotSpiderManager("%s/data/SampleProject" % _PATH,
+                                       settings=settings)
+        self.spider = smanager.create("example3.com", js_enabled=True)
+        self.url = 'http://www.example.com/products/1234?a=1&b=2'
+
+    def splash_request(self, url):
+        return self.spider._add_splash_meta(Request(url))
+
+    def wire_request(self, request, body):
+        """Request as replaced by the Splash middleware"""
+        meta = dict(request.meta, _splash_processed=request.meta['splash'])
+        return request.replace(url='http://localhost:8050/render.html',
+                               method='POST', body=body, meta=meta)
+
+    def test_splash_request_fingerprint(self):
+        request = self.splash_request(self.url)
+        splash = request.meta['splash']
+        self.assertEqual(splash['fingerprint'], splash_render_digest(splash))
+        same = self.splash_request(
+            'http://www.example.com/products/1234?b=2&a=1')
+        self.assertEqual(splash_request_fingerprint(request),
+                         splash_request_fingerprint(same))
+        other = self.splash_request('http://www.example.com/products/1235')
+        self.assertNotEqual(splash_request_fingerprint(request),
+                            splash_request_fingerprint(other))
+        self.assertNotEqual(splash_request_fingerprint(request),
+                            splash_request_fingerprint(Request(self.url)))
+
+    def test_non_splash_request(self):
+        request = Request(self.url)
+        self.assertEqual(splash_request_fingerprint(request),
+                         request_fingerprint(request))
+
+    def test_replaced_request(self):
+        # The body sent to Splash has the sources of the scripts, only the
+        # hashes in the render digest are part of the fingerprint
+        request = self.splash_request(self.url)
+        wire = self.wire_request(request, b'{"js_source": "a();"}')
+        self.assertEqual(
+            splash_request_fingerprint(wire),
+            splash_request_fingerprint(
+                self.wire_request(request, b'{"js_source": "b();"}')))
+        other = self.splash_request('http://www.example.com/products/1235')
+        self.assertNotEqual(
+            splash_request_fingerprint(wire),
+            splash_request_fingerprint(
+                self.wire_request(other, b'{"js_source": "a();"}')))
+
+    def test_request_seen(self):
+        dupefilter = SplashAwareDupeFilter()
+        self.addCleanup(dupefilter.close, 'finished')
+        request = self.splash_request(self.url)
+        self.assertFalse(dupefilter.request_seen(request))
+        self.assertTrue(dupefilter.request_seen(self.splash_request(
+            'http://www.example.com/products/1234?b=2&a=1')))
+        self.assertFalse(dupefilter.request_seen(Request(self.url)))
+        self.assertTrue(dupefilter.request_seen(Request(self.url)))
@@ -0,0 +1,105 @@
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.project import get_project_settings
+
+from slybot.extractionpool import ExtractionTimeout, _picklable_meta
+from slybot.spidermanager import SlybotSpiderManager
+
+from .utils import PATH
+
+PROJECT = "%s/data/SampleProject" % PATH
+
+
+class ExtractionPoolTest(unittest.TestCase):
+    name = "seedsofchange"
+
+    def setUp(self):
+        settings = get_project_settings()
+        settings.set('EXTRACTION_WORKERS', 1)
+        settings.set('LINK_FILTER_ENABLED', True)
+        self.spider = SlybotSpiderManager(
+            PROJECT, settings=settings).create(self.name)
+        self.addCleanup(self.spider.closed, 'finished')
+        smanager = SlybotSpiderManager(PROJECT)
+        self.reference = smanager.create(self.name)
+        self.templates = smanager._specs["spiders"][self.name]["templates"]
+
+    def response(self, template):
+        url = template["url"]
+        return HtmlResponse(url, body=template["original_body"],
+                            encoding='utf-8',
+                            request=Request(url, meta={'depth': 2}))
+
+    @inlineCallbacks
+    def test_extraction(self):
+        for template in self.templates:
+            expected = list(self.reference.parse(self.response(template)))
+            response = self.response(template)
+            results = yield self.spider.parse(response)
+            self.assertEqual(
+                [dict(r) for r in results if not isinstance(r, Request)],
+                [dict(r) for r in expected if not isinstance(r, Request)])
+            self.assertEqual(
+                [r.url for r in results if isinstance(r, Request)],
+                [r.url for r in expected if isinstance(r, Request)])
+        self.assertEqual(response.meta['n_items'], 1)
+        # Items are completed in the worker, the page is never parsed here
+        self.assertNotIn('_slybot_htmlpages', response.__dict__)
+
+        # Links already followed are dropped by the filter of the spider
+        results = yield self.spider.parse(self.response(self.templates[0]))
+        for request in results:
+            if isinstance(request, Request):
+                self.spider.plugins['Annotations'].request_scheduled(
+                    request, self.spider)
+        results = yield self.spider.parse(self.response(self.templates[0]))
+        self.assertEqual([r for r in results if isinstance(r, Request)], [])
+
+    def test_extraction_failure(self):
+        response = self.response(self.templates[1])
+        response._url = 'invalid url'
+        return self.assertFailure(self.spider.parse(response), RuntimeError)
+
+    @inlineCallbacks
+    def test_extraction_timeout(self):
+        pool = self.spider.extraction_pool
+        pool.timeout = 1e-6
+        response = self.response(self.templates[1])
+        yield self.assertFailure(self.spider.parse(response),
+                                 ExtractionTimeout)
+        # The worker stopped the job and is still used
+        worker_pool = pool.pool
+        pool.timeout = 180
+        results = yield self.spider.parse(self.response(self.templates[1]))
+        self.assertTrue(results)
+        self.assertIs(pool.pool, worker_pool)
+
+    @inlineCallbacks
+    def test_hung_worker(self):
+        pool = self.spider.extraction_pool
+        pool.timeout, pool.restart_delay = 0, 0
+        worker_pool = pool.pool
+        response = self.response(self.templates[1])
+        yield self.assertFailure(self.spider.parse(response),
+                                 ExtractionTimeout)
+        self.assertIsNot(pool.pool, worker_pool)
+        pool.timeout, pool.restart_delay = 180, 30
+        results = yield self.spider.parse(self.response(self.templates[1]))
+        self.assertTrue(results)
+
+    @inlineCallbacks
+    def test_queued_jobs(self):
+        # Jobs wait for the only worker before they are sent and timed
+        responses = [self.response(t) for t in self.templates]
+        results = yield defer.gatherResults(
+            [self.spider.parse(response) for response in responses])
+        self.assertEqual(len(results), len(responses))
+        self.assertEqual(len(self.spider.extraction_pool._jobs), 0)
+
+    def test_picklable_meta(self):
+        response = self.response(self.templates[1])
+        response.meta['callback'] = lambda: None
+        self.assertEqual(_picklable_meta(response), {'depth': 2})
@@ -6,7 +6,8 @@ from scrapely.htmlpage import HtmlPage
 from scrapely.extraction import InstanceBasedLearningExtractor
 
 from slybot.extractors import (create_regex_extractor, apply_extractors,
-                               add_extractors_to_descriptors)
+                               add_extractors_to_descriptors,
+                               DescriptorRegistry)
 from slybot.fieldtypes import TextFieldTypeProcessor
 from slybot.item import create_slybot_item_descriptor
 from slybot.plugins.scrapely_annotations.extraction import SlybotIBLExtractor
@@ -227,6 +228,34 @@ class ExtractorTest(TestCase):
             (self.template, {'#default': descriptor}, '0.12.0')])
         self.assertEqual(ibl_extractor.extract(self.target)[0][0]['gender'], [u'Gender'])
 
+    def test_descriptor_registry(self):
+        schemas = {
+            'person': {
+                'fields': {
+                    'gender': {'required': False, 'type': 'text'},
+                    'name': {'required': False, 'type': 'text'}
+                }
+            }
+        }
+        extractors = {1: {"regular_expression": "Gender\\s+(Male|Female)"}}
+        registry = DescriptorRegistry(schemas, extractors)
+        base = registry.descriptor('person', {})
+        self.assertIs(registry.descriptor('person'), base)
+        self.assertIs(base.extractors, registry.compiled)
+        descriptor = registry.descriptor('person', {'gender': [1]})
+        self.assertIs(registry.descriptor('person', [('gender', [1])]),
+                      descriptor)
+        # Only the fields with extractors are copied
+        self.assertIs(descriptor.attribute_map['name'],
+                      base.attribute_map['name'])
+        self.assertIsNot(descriptor.attribute_map['gender'],
+                         base.attribute_map['gender'])
+
+        ibl_extractor = SlybotIBLExtractor([
+            (self.template, {'#default': descriptor}, '0.12.0')])
+        self.assertEqual(ibl_extractor.extract(self.target)[0][0]['gender'],
+                         [u'Male'])
+
     def test_extractor_w_empty_string_extraction(self):
         schema = {
             'fields': {
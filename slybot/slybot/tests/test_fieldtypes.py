@@ -1,7 +1,9 @@
 from unittest import TestCase
 from scrapely.htmlpage import HtmlPage
 
-from slybot.fieldtypes import UrlFieldTypeProcessor, ImagesFieldTypeProcessor
+from slybot.fieldtypes import (UrlFieldTypeProcessor, ImagesFieldTypeProcessor,
+                               DateTimeFieldTypeProcessor)
+from slybot.fieldtypes import date
 
 class FieldTypesUrlEncoding(TestCase):
     def test_not_standard_chars_in_url(self):
@@ -40,5 +42,53 @@ class FieldTypesUrlEncoding(TestCase):
             self.assertEqual(img_p.adapt(img_p.extract(text), htmlpage), url)
             self.assertEqual(url_p.adapt(url_p.extract(text), htmlpage), url)
 
+    def test_adapt_many(self):
+        urls = [u' image.jpg ', None, u"    '/data.jpg'", u' image.jpg ']
+        results = ['http://www.example.com/images/image.jpg', None,
+                   'http://www.example.com/data.jpg',
+                   'http://www.example.com/images/image.jpg']
+        htmlpage = HtmlPage(url=u"http://www.example.com/images/",
+                            body=u'<html><body></body></html>',
+                            encoding='utf-8')
+        url_p = UrlFieldTypeProcessor()
+        self.assertEqual(url_p.adapt_many(urls, htmlpage), results)
+        self.assertEqual(url_p.adapt_many(urls), urls)
+
     def test_blank_image_url(self):
         assert ImagesFieldTypeProcessor().extract(' ') == ''
+
+
+class FieldTypesDate(TestCase):
+    def test_cached_dates(self):
+        processor = DateTimeFieldTypeProcessor()
+        dates = processor.adapt_many([u'Jan 12, 2014', u'no date here',
+                                      u'Jan 12, 2014'])
+        self.assertEqual(dates[0].strftime('%Y-%m-%d'), '2014-01-12')
+        self.assertIsNone(dates[1])
+        self.assertIs(dates[0], dates[2])
+        self.assertIs(processor.adapt(u'Jan 12, 2014'), dates[0])
+        self.assertEqual(len(processor._cache), 2)
+
+    def test_cache_period(self):
+        class Clock(object):
+            now = 86400.0 - 1
+
+            def time(self):
+                return self.now
+        clock = Clock()
+        self.addCleanup(setattr, date, 'time', date.time)
+        date.time = clock
+        processor = DateTimeFieldTypeProcessor()
+        parsed = processor.adapt(u'Jan 12, 2014')
+        self.assertIs(processor.adapt(u'Jan 12, 2014'), parsed)
+        # Dates are parsed again once the minute, here the day, changes
+        clock.now += 1
+        self.assertIsNot(processor.adapt(u'Jan 12, 2014'), parsed)
+
+    def test_languages(self):
+        processor = DateTimeFieldTypeProcessor(languages=['es'])
+        self.assertEqual(
+            processor.adapt(u'12 de enero de 2014').strftime('%Y-%m-%d'),
+            '2014-01-12')
+        self.assertIs(processor._parser(),
+                      DateTimeFieldTypeProcessor(['es'])._parser())
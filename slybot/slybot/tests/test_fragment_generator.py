@@ -79,3 +79,21 @@ class FragmentGeneratorTest(TestCase):
         generator = FragmentGenerator()
 
         self.assertEqual(list(generator(url_spec)), github_start_urls)
+
+    def test_generated_from_position(self):
+        url_spec = {
+            'fragments': [
+                {'type': 'fixed', 'value': 'https://github.com/'},
+                {'type': 'list', 'value': 'scrapinghub scrapy'},
+                {'type': 'fixed', 'value': '/'},
+                {'type': 'range', 'value': '1-10000000'},
+            ]
+        }
+        generator = FragmentGenerator()
+
+        self.assertEqual(generator.count(url_spec), 20000000)
+        self.assertEqual(list(generator(url_spec, 9999999, 5000000)), [
+            'https://github.com/scrapinghub/10000000',
+            'https://github.com/scrapy/5000000',
+            'https://github.com/scrapy/10000000',
+        ])
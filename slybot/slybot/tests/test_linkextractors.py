@@ -1,8 +1,10 @@
 import json
 
+from gzip import GzipFile
+from io import BytesIO
 from os.path import dirname
 from unittest import TestCase
-from scrapy.http import TextResponse, HtmlResponse, Request
+from scrapy.http import TextResponse, HtmlResponse, Request, Response
 from scrapy.settings import Settings
 from slybot.utils import htmlpage_from_response
 
@@ -149,6 +151,31 @@ class Test_XmlLinkExtractors(TestCase):
         self.assertEqual(len(links), 3)
         self.assertEqual(links[0].url, 'http://example.org/feed/')
 
+    def test_streaming(self):
+        for specs, response, urls in [
+                ({"type": "rss", "value": ""}, self.response,
+                 ['http://www.wikipedia.org/']),
+                ({"type": "sitemap", "value": ""}, self.sitemapindex,
+                 ['http://www.example.com/sitemap1.xml.gz']),
+                ({"type": "atom", "value": ""}, self.atom,
+                 ['http://example.org/feed/', 'http://example.org/',
+                  'http://example.org/2003/12/13/atom03'])]:
+            specs['streaming'] = True
+            lextractor = create_linkextractor_from_specs(specs)
+            links = list(lextractor.links_to_follow(response))
+            self.assertEqual([l.url for l in links], urls)
+
+    def test_streaming_gzip(self):
+        body = BytesIO()
+        with GzipFile(fileobj=body, mode='wb') as f:
+            f.write(sitemapfeed.encode('utf-8'))
+        response = Response(url='http://www.example.com/sitemap.xml.gz',
+                            body=body.getvalue())
+        lextractor = SitemapLinkExtractor(streaming=True)
+        links = list(lextractor.links_to_follow(response))
+        self.assertEqual(len(links), 3)
+        self.assertEqual(links[0].url, 'http://www.accommodationforstudents.com/')
+
     def test_xml_remove_namespaces(self):
         specs = {"type": "xpath", "value": "//link/@href", "remove_namespaces": True}
         lextractor = create_linkextractor_from_specs(specs)
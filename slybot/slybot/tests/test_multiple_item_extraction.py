@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 import json
+import os
 import re
 
+from shutil import rmtree
+from tempfile import mkdtemp
+
 from unittest import TestCase
 from scrapy import Request, Item
 from scrapy.settings import Settings
@@ -12,7 +16,10 @@ from slybot.plugins.scrapely_annotations.extraction import (
 from slybot.plugins.scrapely_annotations.extraction.pageparsing import (
     parse_template)
 from slybot.plugins.scrapely_annotations.extraction.container_extractors import (
-    BaseContainerExtractor, ContainerExtractor, RepeatedContainerExtractor)
+    BaseContainerExtractor, ContainerExtractor, RepeatedContainerExtractor,
+    _pattern_matches)
+from slybot.plugins.scrapely_annotations.extraction.region_extractors import (
+    RegionMatchingPage)
 from slybot.plugins.scrapely_annotations.extraction.utils import group_tree
 from slybot.extractors import add_extractors_to_descriptors
 from slybot.item import create_slybot_item_descriptor
@@ -21,6 +28,7 @@ from slybot.plugins.scrapely_annotations.builder import (
 )
 from slybot.spider import IblSpider
 from slybot.spidermanager import SlybotSpiderManager
+from slybot.templatecache import TemplateCache
 from scrapely.extraction.pageobjects import TokenDict
 from scrapely.htmlpage import HtmlPage
 from scrapely.extraction.regionextract import BasicTypeExtractor
@@ -187,6 +195,16 @@ class ContainerExtractorTest(TestCase):
                                                     template)
         self.assertEqual(e, [33554432, 33554439, 33554438])
 
+    def test_pattern_matches(self):
+        tokens = template.page_tokens
+        for pattern in (tokens[3:5], tokens[-2:], tokens[:1], tokens[:0]):
+            end = len(tokens) - len(pattern)
+            matches = _pattern_matches(tokens, pattern, 2, end)
+            self.assertEqual(
+                matches.tolist(),
+                [bool((tokens[i:i + len(pattern)] == pattern).all())
+                 for i in range(2, end + 1)])
+
     def test_extract(self):
         extractors = ContainerExtractor.apply(unvalidated_template,
                                               basic_extractors)
@@ -236,6 +254,20 @@ class ContainerExtractorTest(TestCase):
                      u'cassandra-from']
         })
 
+    def test_region_matches_are_reused(self):
+        extractors = ContainerExtractor.apply(unvalidated_template,
+                                              basic_extractors)
+        page = RegionMatchingPage(extraction_page)
+        first = [i.dump() for e in extractors for i in e.extract(page)]
+        matches = dict(page.region_matches)
+        self.assertTrue(matches)
+        second = [i.dump() for e in extractors for i in e.extract(page)]
+        self.assertEqual(page.region_matches, matches)
+        self.assertEqual(first, second)
+        self.assertEqual(
+            first, [i.dump() for e in extractors
+                    for i in e.extract(extraction_page)])
+
     def test_extract_single_attribute_to_multiple_fields(self):
         extractors = {'1': {'regular_expression': '(.*)\s'},
                       '2': {'regular_expression': '\s(.*)'}}
@@ -326,6 +358,34 @@ class ContainerExtractorTest(TestCase):
         self.assertTrue(all('description' in item and item['description']
                             for item in data))
 
+    def test_template_index(self):
+        templates = [(sample_411, {}, '0.13.0'),
+                     (simple_template, simple_descriptors, '0.13.0')]
+        ibl_extractor = SlybotIBLExtractor(templates, candidates=1)
+        index = ibl_extractor.template_index
+        trees = ibl_extractor.extraction_trees
+        page = parse_extraction_page(ibl_extractor.token_dict, target1)
+        ordered = index.order(trees, page.page_tokens)
+        self.assertIs(ordered[0].template.htmlpage, simple_template)
+        # Other templates are kept for the full scan fallback
+        self.assertEqual(len(ordered), len(trees))
+        data, _ = ibl_extractor.extract(target1)
+        self.assertEqual(len(data), 10)
+        data = ibl_extractor.extract(page_411)[0][1]
+        self.assertIn('full_name', data)
+
+    def test_template_cache(self):
+        cache = TemplateCache(mkdtemp())
+        self.addCleanup(rmtree, cache.directory)
+        templates = [(simple_template, simple_descriptors, '0.13.0')]
+        built = SlybotIBLExtractor(templates, template_cache=cache)
+        self.assertEqual(len(os.listdir(cache.directory)), 1)
+        cached = SlybotIBLExtractor(templates, template_cache=cache)
+        self.assertEqual(cached.token_dict.token_ids,
+                         built.token_dict.token_ids)
+        self.assertEqual(cached.extract(target1)[0],
+                         built.extract(target1)[0])
+
     def test_missing_selectors(self):
         spider, page, results = open_spider_page_and_results('cars.com.json')
         items = [i for i in spider.parse(page) if not isinstance(i, Request)]
@@ -1,5 +1,9 @@
+import json
+
 from unittest import TestCase
-from slybot.pageactions import filter_for_url, PageActionsMiddleware
+from slybot.pageactions import (filter_for_url, PageActionsMiddleware,
+                                JS_SOURCE, LUA_SOURCE)
+from slybot.splashscripts import splash_scripts
 from os.path import dirname
 from scrapy import Request
 from scrapy import Spider
@@ -54,3 +58,27 @@ class PATest(TestCase):
         m.process_request(req, spider)
         self.assertEqual(req.meta['splash']['endpoint'], 'render.html') # Page actions disabled
 
+    def test_middleware_scripts(self):
+        m = PageActionsMiddleware()
+        spider = Spider('test_spider')
+        spider.page_actions = [{
+            "type": "click",
+            "selector": "#showmore"
+        }, {
+            "type": "click",
+            "selector": "#next",
+            "accept": "other\\.com"
+        }]
+        req = mkreq()
+        m.process_request(req, spider)
+        scripts = req.meta['splash']['scripts']
+        self.assertNotIn('slybot_actions_source', req.meta['splash']['args'])
+        args = splash_scripts.expand(req.meta['splash'])
+        self.assertEqual(args['lua_source'], LUA_SOURCE)
+        self.assertEqual(args['slybot_actions_source'],
+                         JS_SOURCE % json.dumps(spider.page_actions[:1]))
+        self.assertEqual(args['url'], 'http://test.com')
+
+        other = mkreq()
+        m.process_request(other, spider)
+        self.assertEqual(other.meta['splash']['scripts'], scripts)
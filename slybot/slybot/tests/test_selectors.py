@@ -26,6 +26,13 @@ class SpiderTest(TestCase):
         self.assertEqual(item['breadcrumbs'], [u'Seeds & Supplies', u'Seeds', u'Vegetables', u'Squash & Pumpkins'])
         self.assertEqual(item['image'], [u'previous data', u'/images/product_shots/PPS14165B.jpg'])
 
+        # Results are reused for other items from the same response
+        other = {'_template': u'4fac3b47688f920c7800000f'}
+        spider.plugins['Selectors'].process_item(other, response)
+        self.assertEqual(other['breadcrumbs'], item['breadcrumbs'])
+        self.assertIsNot(other['breadcrumbs'], item['breadcrumbs'])
+        self.assertEqual(other['image'], [u'/images/product_shots/PPS14165B.jpg'])
+
     def test_spider_with_inbuilt_selectors(self):
         """Test selectors for text, price, date and html extractors."""
         name = 'books.toscrape.com'
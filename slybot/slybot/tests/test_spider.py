@@ -1,21 +1,30 @@
 from unittest import TestCase
 from os.path import dirname, join
 from contextlib import contextmanager
+from copy import deepcopy
+from shutil import make_archive, rmtree
+from tempfile import mkdtemp
 
 from scrapy.http import (Response, HtmlResponse, XmlResponse, TextResponse,
                          Request)
 from scrapy.utils.project import get_project_settings
 from scrapy.utils.reqser import request_to_dict
 
-from scrapely.htmlpage import HtmlPage
+from scrapely.htmlpage import HtmlPage, HtmlTag
 
-from slybot.spidermanager import SlybotSpiderManager
+from slybot import extractionpool
+from slybot.spider import copy_spec
+from slybot.spidermanager import (SlybotSpiderManager,
+                                  ZipfileSlybotSpiderManager)
+from slybot.utils import add_tagids, htmlpage_from_response
 
 
 @contextmanager
-def splash_spider_manager(splash_url='http://localhost:8050'):
+def splash_spider_manager(splash_url='http://localhost:8050', **kwargs):
     settings = get_project_settings()
     settings.set('SPLASH_URL', splash_url)
+    for name, value in kwargs.items():
+        settings.set(name, value)
     yield SlybotSpiderManager("%s/data/SampleProject" % _PATH,
                               settings=settings)
 
@@ -31,6 +40,57 @@ class SpiderTest(TestCase):
                 "networkhealth.com", "allowed_domains", "any_allowed_domains", "example.com", "example2.com",
                 "example3.com", "example4.com", "sitemaps", "books.toscrape.com"]))
 
+    def test_lazy_spider_loading(self):
+        smanager = SlybotSpiderManager("%s/data/SampleProject" % _PATH)
+        spiders = smanager._specs["spiders"]
+        self.assertEqual(spiders._specs, {})
+        spider = smanager.create("example.com")
+        self.assertEqual(spider.name, "example.com")
+        self.assertEqual(list(spiders._specs), ["example.com"])
+        self.assertIs(spiders["example.com"], spiders["example.com"])
+        self.assertRaises(KeyError, smanager.create, "missing")
+
+    def test_zipfile_spider_manager(self):
+        project_dir = "%s/data/SampleProject" % _PATH
+        zipdir = mkdtemp()
+        self.addCleanup(rmtree, zipdir)
+        zipfile = make_archive(join(zipdir, 'project'), 'zip', project_dir)
+        smanager = ZipfileSlybotSpiderManager(None, zipfile)
+        self.assertEqual(set(smanager.list()), set(self.smanager.list()))
+        self.assertEqual(smanager._specs["spiders"]["ebay"],
+                         self.smanager._specs["spiders"]["ebay"])
+        self.assertEqual(smanager._specs["items"],
+                         self.smanager._specs["items"])
+        spider = smanager.create("example4.com")
+        self.assertEqual(spider.name, "example4.com")
+
+    def test_spider_spec_is_not_modified(self):
+        for name in ("pinterest.com", "seedsofchange", "books.toscrape.com"):
+            spec = self.smanager._specs["spiders"][name]
+            expected = deepcopy(spec)
+            self.smanager.create(name)
+            self.assertEqual(spec, expected)
+            copied = copy_spec(spec)
+            for template, original in zip(copied["templates"],
+                                          spec["templates"]):
+                self.assertIsNot(template, original)
+                self.assertIs(template.get("annotated_body"),
+                              original.get("annotated_body"))
+
+    def test_form_spider_spec_is_not_modified(self):
+        # Values read from the url of a form field are kept by the spider
+        spec = self.smanager._specs["spiders"]["ebay2"]
+        expected = deepcopy(spec)
+        spider = self.smanager.create("ebay2")
+        request = list(spider.start_requests())[0]
+        with open(join(_PATH, "data", "test_params.txt")) as f:
+            response = HtmlResponse(url=request.url, body=f.read())
+        response.request = request
+        list(request.callback(response))
+        self.assertEqual(spec, expected)
+        request = list(self.smanager.create("ebay2").start_requests())[0]
+        self.assertEqual(request.url, 'file://tmp/test_params.txt')
+
     def test_spider_with_link_template(self):
         name = "seedsofchange"
         spider = self.smanager.create(name)
@@ -307,6 +367,59 @@ class SpiderTest(TestCase):
             for variant in item["variants"]:
                 self.assertEqual(type(variant), dict)
 
+    def test_response_parsed_once(self):
+        html = ("<html><head><title>T</title></head><body><p class=a>x</p>"
+                "<br/><ins>y</ins></body></html>")
+        response = HtmlResponse(url='http://www.example.com/', body=html)
+        page = htmlpage_from_response(response, _add_tagids=True)
+        self.assertIs(page, htmlpage_from_response(response, _add_tagids=True))
+        self.assertIn('data-tagid="0"', page.body)
+        reparsed = HtmlPage(body=page.body).parsed_body
+        self.assertEqual([(e.start, e.end) for e in page.parsed_body],
+                         [(e.start, e.end) for e in reparsed])
+        self.assertIs(page.selector, page.selector)
+
+    def test_add_tagids(self):
+        html = ("<html><BODY class='a'>x<br/><ins>y</ins>"
+                "<p data-tagid=\"9\">z</p></body></html>")
+        tagged, parsed = add_tagids(html, parsed=True)
+        self.assertEqual(
+            tagged,
+            '<html data-tagid="0"><BODY data-tagid="1" class=\'a\'>x'
+            '<br data-tagid="2"/><ins>y</ins><p data-tagid="3">z</p>'
+            '</body></html>')
+        tags = [e for e in parsed if isinstance(e, HtmlTag) and
+                e.attributes.get('data-tagid') is not None]
+        self.assertEqual([e.attributes['data-tagid'] for e in tags],
+                         ['0', '1', '2', '3'])
+        for element in tags:
+            self.assertEqual(
+                HtmlPage(body=tagged[element.start:]).parsed_body[0]
+                .attributes['data-tagid'], element.attributes['data-tagid'])
+
+    def test_extraction_in_worker(self):
+        name = "seedsofchange"
+        spider = self.smanager.create(name)
+        self.assertIsNone(spider.extraction_pool)
+        template = self.smanager._specs["spiders"][name]["templates"][1]
+        args = (template["url"], {}, template["original_body"].encode('utf-8'),
+                'utf-8')
+        extractionpool._worker_spider = spider
+        try:
+            succeeded, (results, n_items) = extractionpool._extract(*args)
+        finally:
+            extractionpool._worker_spider = None
+        self.assertTrue(succeeded)
+        self.assertEqual(n_items, 1)
+        response = HtmlResponse(url=args[0], body=args[2], encoding='utf-8')
+        expected = list(spider.handle_html(response))
+        self.assertEqual(
+            [value[1] for kind, value in results if kind == 'item'],
+            [dict(i) for i in expected if not isinstance(i, Request)])
+        self.assertEqual(
+            [value['url'] for kind, value in results if kind == 'request'],
+            [r.url for r in expected if isinstance(r, Request)])
+
     def test_start_requests(self):
         name = "example.com"
         spider = self.smanager.create(name)
@@ -393,3 +506,36 @@ Product B,http://www.example.com/path2,B"""
         self.assertEqual(request.meta.get('splash'), None)
         request = spider._add_splash_meta(Request(product_url))
         self.assertEqual(request.meta['splash']['args']['url'], product_url)
+
+    def test_js_render_on_miss(self):
+        with splash_spider_manager(SPLASH_RENDER_ON_MISS=True,
+                                   SPLASH_RENDER_ON_MISS_MIN_PAGES=2) as manager:
+            spider = manager.create("example3.com", js_enabled=True)
+        url = 'http://www.example.com/aboutus'
+        request = spider._add_splash_meta(Request(url))
+        self.assertEqual(request.meta.get('splash'), None)
+        self.assertEqual(request.meta['render_on_miss'], 'raw')
+
+        # A page without items is requested again through Splash
+        response = HtmlResponse(url, body=b'<html><body></body></html>',
+                                request=request)
+        rendered = list(spider.parse(response))[-1]
+        self.assertEqual(rendered.meta['render_on_miss'], 'rendered')
+        self.assertEqual(rendered.meta['splash']['args']['url'], url)
+        self.assertTrue(rendered.dont_filter)
+        response = HtmlResponse(url, body=b'<html><body></body></html>',
+                                request=rendered)
+        self.assertEqual(list(spider.parse(response)), [])
+
+        # Pages without items once rendered are no longer rendered
+        spider.render_stats.record(url, True, False)
+        response = HtmlResponse(url, body=b'<html><body></body></html>',
+                                request=request)
+        self.assertEqual(list(spider.parse(response)), [])
+
+        # Pages that only have items once rendered go straight to Splash
+        product_url = 'http://www.example.com/products/1'
+        for i in range(2):
+            spider.render_stats.record(product_url, True, True)
+        request = spider._add_splash_meta(Request(product_url))
+        self.assertEqual(request.meta['splash']['args']['url'], product_url)
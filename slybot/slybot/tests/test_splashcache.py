@@ -0,0 +1,90 @@
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from slybot import splashcache
+from slybot.splashcache import RenderCache
+from slybot.splashscripts import splash_scripts
+
+
+def splash_options(url, **args):
+    args['url'] = url
+    return {'endpoint': 'render.html', 'args': args}
+
+
+class RenderCacheTest(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.addCleanup(rmtree, self.directory)
+
+    def cache(self, **kwargs):
+        cache = RenderCache(join(self.directory, 'cache.sqlite'), **kwargs)
+        self.addCleanup(cache.db.close)
+        return cache
+
+    def test_key(self):
+        url = 'http://example.com/'
+        key = RenderCache.key(splash_options(url, wait=5))
+        self.assertEqual(key, RenderCache.key(splash_options(url, wait=5)))
+        self.assertNotEqual(key, RenderCache.key(splash_options(url, wait=1)))
+        self.assertNotEqual(
+            key, RenderCache.key(splash_options(url + 'other', wait=5)))
+        # Scripts are part of the key by their hash
+        options = splash_options(url, wait=5)
+        options['scripts'] = {
+            'js_source': splash_scripts.register('function(){}')}
+        self.assertEqual(
+            RenderCache.key(options),
+            RenderCache.key(splash_options(url, wait=5,
+                                           js_source='function(){}')))
+
+    def test_get_set(self):
+        cache = self.cache()
+        headers = {'Content-Type': ['text/html']}
+        cache.set('key', 'http://example.com/', headers, b'<html></html>')
+        self.assertEqual(cache.get('key'),
+                         ('http://example.com/', headers, b'<html></html>'))
+        self.assertIsNone(cache.get('missing'))
+
+    def test_batched_commits(self):
+        cache = self.cache()
+        cache.cleanup_interval = 2
+        cache.set('0', 'http://example.com/0', {}, b'')
+        self.assertIsNone(self.cache().get('0'))
+        cache.set('1', 'http://example.com/1', {}, b'')
+        self.assertIsNotNone(self.cache().get('0'))
+        cache.set('2', 'http://example.com/2', {}, b'')
+        self.assertIsNone(self.cache().get('2'))
+        cache.close()
+        self.assertIsNotNone(self.cache().get('2'))
+
+    def test_eviction(self):
+        cache = self.cache(max_pages=2)
+        for i in range(3):
+            cache.set(str(i), 'http://example.com/%d' % i, {}, b'')
+        cache.cleanup()
+        self.assertIsNone(cache.get('0'))
+        self.assertIsNotNone(cache.get('2'))
+
+    def test_expiry(self):
+        class Clock(object):
+            now = 1000.0
+
+            def time(self):
+                return self.now
+        clock = Clock()
+        self.addCleanup(setattr, splashcache, 'time', splashcache.time)
+        splashcache.time = clock
+        cache = self.cache(ttl=60)
+        cache.set('0', 'http://example.com/0', {}, b'')
+        clock.now += 30
+        cache.set('1', 'http://example.com/1', {}, b'')
+        self.assertIsNotNone(cache.get('0'))
+        clock.now += 40
+        self.assertIsNone(cache.get('0'))
+        self.assertIsNotNone(cache.get('1'))
+        cache.cleanup()
+        self.assertEqual(
+            [key for key, in cache.db.execute('SELECT key FROM pages')],
+            ['1'])
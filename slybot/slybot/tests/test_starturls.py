@@ -1,5 +1,6 @@
 from unittest import TestCase
 
+from slybot.bloomfilter import ScalableBloomFilter
 from slybot.starturls import FragmentGenerator, IdentityGenerator, StartUrlCollection, UrlGenerator
 
 
@@ -57,6 +58,84 @@ class StartUrlCollectionTest(TestCase):
 
         self.assertEqual(list(generated), generated_start_urls)
 
+    def test_indexed_generation(self):
+        start_urls = [
+            'http://google.com',
+            {
+                'type': 'generated',
+                'url': 'https://github.com/[0-4]',
+                'fragments': [
+                    {'type': 'fixed', 'value': 'https://github.com/'},
+                    {'type': 'range', 'value': '0-4'},
+                ]
+            },
+            'http://google.com',
+        ]
+        generated = StartUrlCollection(start_urls, self.generators)
+        self.assertEqual(list(generated.iter_indexed(start=4)), [
+            (4, 'https://github.com/3'),
+            (5, 'https://github.com/4'),
+            (6, 'http://google.com'),
+        ])
+        self.assertEqual(list(generated.iter_indexed(shard=1, shards=2)), [
+            (1, 'https://github.com/0'),
+            (3, 'https://github.com/2'),
+            (5, 'https://github.com/4'),
+        ])
+        self.assertEqual(
+            list(generated.iter_indexed(start=2, shard=0, shards=3)),
+            [(3, 'https://github.com/2'), (6, 'http://google.com')])
+        # Repeated start urls are only dropped when deduplicating
+        self.assertEqual(
+            list(generated.iter_indexed(start=4,
+                                        url_filter=ScalableBloomFilter())),
+            [(4, 'https://github.com/3'), (5, 'https://github.com/4')])
+
+    def test_indexed_generated_urls(self):
+        start_urls = [
+            {
+                "template": "https://github.com/{}/{}",
+                "paths": [
+                    {"type": "options", "values": ["scrapy", "scrapinghub"]},
+                    {"type": "range", "values": [0, 10000000]},
+                ],
+                "params": [],
+                "params_template": {}
+            },
+            'http://google.com',
+        ]
+        generated = StartUrlCollection(start_urls, self.generators)
+        self.assertEqual(
+            list(generated.iter_indexed(start=19999999, shard=1, shards=2)),
+            [(19999999, 'https://github.com/scrapinghub/9999999')])
+        self.assertEqual(list(generated.iter_indexed(start=20000000)),
+                         [(20000000, 'http://google.com')])
+
+    def test_overlapping_generation(self):
+        start_urls = [
+            {
+                'type': 'generated',
+                'url': 'https://github.com/[0-2]',
+                'fragments': [
+                    {'type': 'fixed', 'value': 'https://github.com/'},
+                    {'type': 'range', 'value': '0-2'},
+                ]
+            },
+            {
+                'type': 'generated',
+                'url': 'https://github.com/[...]',
+                'fragments': [
+                    {'type': 'fixed', 'value': 'https://github.com/'},
+                    {'type': 'range', 'value': '2-3'},
+                ]
+            },
+        ]
+        generated = StartUrlCollection(start_urls, self.generators)
+        urls = [url for _, url in
+                generated.iter_indexed(url_filter=ScalableBloomFilter())]
+        self.assertEqual(urls, ['https://github.com/0', 'https://github.com/1',
+                                'https://github.com/2', 'https://github.com/3'])
+
     def test_unique_legacy_urls(self):
         start_urls = [
             'http://google.com',
@@ -1,19 +1,29 @@
-from six.moves.urllib_parse import urlparse
+from six.moves.urllib_parse import parse_qsl, urlparse, urlsplit
 import os
 import json
 import re
+import threading
 
 from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
+from scrapely.extraction.pageparsing import parse_extraction_page
 from scrapely.htmlpage import HtmlPage, HtmlTag, HtmlTagType
+from scrapy.selector import Selector
 from scrapy.utils.misc import load_object
 
+from slybot.projectfiles import DirectoryFiles
+
 
 TAGID = u"data-tagid"
 GENERATEDTAGID = u"data-genid"
 OPEN_TAG = HtmlTagType.OPEN_TAG
 CLOSE_TAG = HtmlTagType.CLOSE_TAG
 UNPAIRED_TAG = HtmlTagType.UNPAIRED_TAG
+_URL_DIGITS_RE = re.compile(r"\d+")
 
 
 def iter_unique_scheme_hostname(urls):
@@ -27,81 +37,209 @@ def iter_unique_scheme_hostname(urls):
     return list(scheme_hostname)
 
 
-def open_project_from_dir(project_dir):
-    specs = {"spiders": {}}
+def url_pattern(url):
+    """Url with numbers and query values removed
+
+    >>> url_pattern('http://example.com/product/123?page=2&sort=asc')
+    'example.com/product/0?page&sort'
+    """
+    parts = urlsplit(url)
+    pattern = parts.netloc + _URL_DIGITS_RE.sub('0', parts.path)
+    params = sorted(set(k for k, _ in parse_qsl(parts.query,
+                                                 keep_blank_values=True)))
+    if params:
+        pattern += '?' + '&'.join(params)
+    return pattern
+
+
+def open_project_from_dir(project_dir, template_cache=None, lazy=False):
+    """Load the specs of the project in `project_dir`
+
+    With `lazy` the spider specs are only loaded when they are used.
+    """
+    return open_project(DirectoryFiles(project_dir), template_cache, lazy)
+
+
+def open_project(files, template_cache=None, lazy=False):
+    """Load the specs of the project read from `files`
+
+    With `lazy` the spider specs are only loaded when they are used.
+    """
+    specs = {}
     try:
-        with open(os.path.join(project_dir, "project.json")) as f:
-            specs["project"] = json.load(f)
+        specs["project"] = json.loads(files.read("project.json"))
     except IOError:
         specs["project"] = {}
-    with open(os.path.join(project_dir, "items.json")) as f:
-        specs["items"] = json.load(f)
-    with open(os.path.join(project_dir, "extractors.json")) as f:
-        specs["extractors"] = json.load(f)
-
-    spec_base = os.path.join(project_dir, "spiders")
-    for fname in os.listdir(spec_base):
-        if fname.endswith(".json"):
-            spider_name = os.path.splitext(fname)[0]
-            with open(os.path.join(spec_base, fname)) as f:
-                try:
-                    spec = json.load(f)
-                    template_names = spec.get("template_names")
-                    if template_names:
-                        templates = load_external_templates(spec_base,
-                                                            spider_name,
-                                                            template_names)
-                        spec.setdefault("templates", []).extend(templates)
-                    else:
-                        templates = []
-                        for template in spec.get('templates', []):
-                            if template.get('version') < '0.13.0':
-                                templates.append(template)
-                            else:
-                                templates.append(_build_sample(template))
-                    specs["spiders"][spider_name] = spec
-                except ValueError as e:
-                    raise ValueError(
-                        "Error parsing spider (invalid JSON): %s: %s" %
-                        (fname, e)
-                    )
+    specs["items"] = json.loads(files.read("items.json"))
+    specs["extractors"] = json.loads(files.read("extractors.json"))
+
+    specs["spiders"] = SpiderSpecs(files, template_cache)
+    if not lazy:
+        specs["spiders"] = dict(specs["spiders"].items())
     return specs
 
 
-def load_external_templates(spec_base, spider_name, template_names):
+def load_spider_spec(files, spider_name, template_cache=None):
+    """Load the spec of a spider and its templates"""
+    fname = spider_name + ".json"
+    try:
+        spec = json.loads(files.read("spiders", fname))
+        template_names = spec.get("template_names")
+        if template_names:
+            templates = load_external_templates(files, spider_name,
+                                                template_names,
+                                                template_cache)
+            spec.setdefault("templates", []).extend(templates)
+        else:
+            templates = []
+            for template in spec.get('templates', []):
+                if template.get('version') < '0.13.0':
+                    templates.append(template)
+                else:
+                    templates.append(_build_sample(template, template_cache))
+        return spec
+    except ValueError as e:
+        raise ValueError(
+            "Error parsing spider (invalid JSON): %s: %s" % (fname, e)
+        )
+
+
+class SpiderSpecs(Mapping):
+    """Spider specs of a project loaded the first time they are used
+
+    Spider names are found from the files in the spiders directory so only
+    the specs and templates of the spiders used are loaded.
+    """
+    def __init__(self, files, template_cache=None):
+        self.files = files
+        self.template_cache = template_cache
+        self._names = frozenset(os.path.splitext(fname)[0]
+                                for fname in files.listdir("spiders")
+                                if fname.endswith(".json"))
+        self._specs = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, spider_name):
+        try:
+            return self._specs[spider_name]
+        except KeyError:
+            if spider_name not in self._names:
+                raise
+        with self._lock:
+            if spider_name not in self._specs:
+                self._specs[spider_name] = load_spider_spec(
+                    self.files, spider_name, self.template_cache)
+            return self._specs[spider_name]
+
+    def __contains__(self, spider_name):
+        return spider_name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+def load_external_templates(files, spider_name, template_names,
+                            template_cache=None):
     """A generator yielding the content of all passed `template_names` for
     `spider_name`.
     """
     for name in template_names:
-        with open(os.path.join(spec_base, spider_name, name + ".json")) as f:
-            sample = json.load(f)
-            samples_sub_dir = os.path.join(spec_base, spider_name, name)
-            if (os.path.exists(samples_sub_dir) and
-                    os.path.isdir(samples_sub_dir)):
-                for fname in os.listdir(samples_sub_dir):
-                    if fname.endswith('.html'):
-                        with open(os.path.join(samples_sub_dir, fname)) as f:
-                            attr = fname[:-len('.html')]
-                            sample[attr] = f.read().decode('utf-8')
-            yield _build_sample(sample)
-
-
-def _build_sample(sample):
+        sample = json.loads(files.read("spiders", spider_name, name + ".json"))
+        if files.isdir("spiders", spider_name, name):
+            for fname in files.listdir("spiders", spider_name, name):
+                if fname.endswith('.html'):
+                    attr = fname[:-len('.html')]
+                    sample[attr] = files.read(
+                        "spiders", spider_name, name, fname).decode('utf-8')
+        yield _build_sample(sample, template_cache)
+
+
+def _build_sample(sample, template_cache=None):
     from slybot.plugins.scrapely_annotations.builder import Annotations
     data = sample.get('plugins', {}).get('annotations-plugin')
     if data:
-        Annotations().save_extraction_data(data, sample)
+        def build():
+            Annotations().save_extraction_data(data, sample)
+            return {'annotated_body': sample['annotated_body'],
+                    'extracts': data['extracts']}
+        if template_cache is None:
+            built = build()
+        else:
+            key = template_cache.key('sample', sample)
+            built = template_cache.get_or_build(key, build)
+        sample['annotated_body'] = built['annotated_body']
+        data['extracts'] = built['extracts']
     sample['page_id'] = sample.get('page_id') or sample.get('id') or ""
     sample['annotated'] = True
     return sample
 
 
+class ParsedHtmlPage(HtmlPage):
+    """HtmlPage that keeps every parsed form of its body
+
+    The scrapely parsed body, the extraction pages built from it and the lxml
+    tree are created at most once so that all stages handling a response can
+    share them.
+    """
+    def __init__(self, url=None, headers=None, body=None, page_id=None,
+                 encoding='utf-8', parsed_body=None):
+        self._preparsed_body = parsed_body
+        self._extraction_pages = {}
+        self._selector = None
+        super(ParsedHtmlPage, self).__init__(url, headers, body, page_id,
+                                             encoding)
+
+    def _set_body(self, body):
+        parsed_body, self._preparsed_body = self._preparsed_body, None
+        if parsed_body is None:
+            super(ParsedHtmlPage, self)._set_body(body)
+        else:
+            self._body = body
+            self.parsed_body = parsed_body
+        self._extraction_pages = {}
+        self._selector = None
+
+    body = property(lambda x: x._body, _set_body, doc="raw html for the page")
+
+    @property
+    def selector(self):
+        """lxml tree of the page body"""
+        if self._selector is None:
+            self._selector = Selector(text=self.body)
+        return self._selector
+
+    def extraction_page(self, token_dict):
+        """Tokenized version of this page for the given token dict"""
+        try:
+            return self._extraction_pages[token_dict]
+        except KeyError:
+            page = parse_extraction_page(token_dict, self)
+            self._extraction_pages[token_dict] = page
+            return page
+
+
 def htmlpage_from_response(response, _add_tagids=False):
+    """Return a ParsedHtmlPage for the response.
+
+    The page is cached on the response so that the annotations plugin, the
+    link extractors and other plugins all share a single parse of its body.
+    """
+    cache = response.__dict__.setdefault('_slybot_htmlpages', {})
+    try:
+        return cache[_add_tagids]
+    except KeyError:
+        pass
     body = response.body_as_unicode()
+    parsed_body = None
     if _add_tagids:
-        body = add_tagids(body)
-    return HtmlPage(response.url, response.headers, body,
-                    encoding=response.encoding)
+        body, parsed_body = _modify_tagids(body, parsed=True)
+    page = ParsedHtmlPage(response.url, response.headers, body,
+                          encoding=response.encoding, parsed_body=parsed_body)
+    cache[_add_tagids] = page
+    return page
 
 
 def load_plugins(settings):
@@ -258,30 +396,75 @@ def _must_add_tagid(element):
             element.tag != 'ins')
 
 
-def _modify_tagids(source, add=True):
-    """Add or remove tags ids to/from HTML document"""
+def _tag_name_end(body, element):
+    """Offset just after the tag name in the source, None if not found"""
+    name_end = element.start + 1 + len(element.tag)
+    if (body[element.start:element.start + 1] == u'<' and
+            body[element.start + 1:name_end].lower() == element.tag.lower()):
+        return name_end
+
+
+def _modify_tagids(source, add=True, parsed=False):
+    """Add or remove tags ids to/from HTML document
+
+    Tag ids are added by inserting the attribute after the tag name, the rest
+    of the document is copied untouched. Tags that already have a tag id and
+    tags having their tag id removed are serialized again.
+
+    If `parsed` is True the parsed elements are returned along with the new
+    document. Their offsets are moved to match the new document so it doesn't
+    need to be parsed again.
+    """
     output = []
     tagcount = 0
+    copied = 0  # Source offset up to which the source has been copied
+    shift = 0  # Difference between new document and source offsets
     if not isinstance(source, HtmlPage):
         source = HtmlPage(body=source)
+    body = source.body
     for element in source.parsed_body:
+        start, end = element.start, element.end
+        new_start = start + shift
         if _must_add_tagid(element):
             if add:
-                element.attributes[TAGID] = str(tagcount)
+                tagid = str(tagcount)
                 tagcount += 1
-            else:  # Remove previously added tagid
-                element.attributes.pop(TAGID, None)
-            output.append(serialize_tag(element))
-        else:
-            output.append(source.body[element.start:element.end])
+                name_end = _tag_name_end(body, element)
+                # Only look for a tag id in the source of the attributes
+                if name_end is None or TAGID in body[name_end:end].lower():
+                    element.attributes[TAGID] = tagid
+                    fragment = serialize_tag(element)
+                    output.extend((body[copied:start], fragment))
+                    copied = end
+                    shift += len(fragment) - (end - start)
+                else:
+                    element.attributes[TAGID] = tagid
+                    inserted = u' %s="%s"' % (TAGID, tagid)
+                    output.extend((body[copied:name_end], inserted))
+                    copied = name_end
+                    shift += len(inserted)
+            elif element.attributes.pop(TAGID, None) is not None:
+                fragment = serialize_tag(element)
+                output.extend((body[copied:start], fragment))
+                copied = end
+                shift += len(fragment) - (end - start)
+        if parsed:
+            element.start = new_start
+            element.end = end + shift
+    output.append(body[copied:])
+    if parsed:
+        return u''.join(output), source.parsed_body
     return u''.join(output)
 
 
-def add_tagids(source):
+def add_tagids(source, parsed=False):
     """
     Applies a unique attribute code number for each tag element in order to be
-    identified later in the process of apply annotation"""
-    return _modify_tagids(source)
+    identified later in the process of apply annotation
+
+    The parsed elements of the returned document can be returned along with
+    it, see `_modify_tagids`."""
+    return _modify_tagids(source, parsed=parsed)
 
 
 def remove_tagids(source):
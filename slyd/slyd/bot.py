@@ -16,6 +16,7 @@ error to display. Otherwise you will find the following fields:
 import json
 import errno
 
+from collections import OrderedDict
 from functools import partial
 from twisted.web.http import RESPONSES
 from twisted.web.resource import Resource
@@ -60,6 +61,8 @@ class Bot(Resource):
         self.spec_manager = spec_manager
         settings.set('PLUGINS', [p['bot'] for p in settings.get('PLUGINS')])
         self.runner = CrawlerRunner(settings)
+        self.spiders = SpiderCache(settings.getint('BOT_SPIDER_CACHE_SIZE',
+                                                   16))
         log.msg("bot initialized", level=log.DEBUG)
 
     def keep_spider_alive(self, spider):
@@ -71,6 +74,28 @@ class Bot(Resource):
         log.msg("bot stopped", level=log.DEBUG)
 
 
+class SpiderCache(object):
+    """Spiders built from project specs, the least recently used dropped
+    first
+
+    Spiders are stored with the revision of their project and rebuilt once
+    its specs change.
+    """
+    def __init__(self, max_spiders):
+        self.max_spiders = max_spiders
+        self._spiders = OrderedDict()
+
+    def get_or_build(self, key, build):
+        try:
+            value = self._spiders.pop(key)
+        except KeyError:
+            value = build()
+        self._spiders[key] = value
+        while len(self._spiders) > self.max_spiders:
+            self._spiders.popitem(last=False)
+        return value
+
+
 class BotResource(SlydJsonResource):
     def __init__(self, bot):
         Resource.__init__(self)
@@ -207,13 +232,21 @@ class Fetch(BotResource):
         if spider is None:
             return None, None
         pspec = self.bot.spec_manager.project_spec(project, auth_info)
-        try:
+
+        def build():
             spider_spec = pspec.spider_with_templates(spider)
             items_spec = pspec.resource('items')
             extractors = pspec.resource('extractors')
             return (IblSpider(spider, spider_spec, items_spec, extractors,
                               self.bot.runner.settings, **kwargs),
                     spider_spec['templates'])
+        try:
+            if kwargs:
+                return build()
+            # Building a spider reads and parses all of its templates so
+            # they are reused until the project is changed
+            key = (project, pspec.user, spider, pspec.revision(spider))
+            return self.bot.spiders.get_or_build(key, build)
         except IOError as ex:
             if ex.errno == errno.ENOENT:
                 log.msg("skipping extraction, no spec: %s" % ex.filename)
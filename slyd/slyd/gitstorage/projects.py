@@ -108,6 +108,8 @@ class GitProjectsManager(ProjectsManager, GitProjectMixin):
         self.modify_request = {
             'download': self._render_file
         }
+        self.changing_commands = {'create', 'mv', 'rm', 'edit', 'publish',
+                                  'discard', 'save', 'copy'}
 
     def all_projects(self):
         return Repoman.list_repos()
@@ -2,7 +2,7 @@ import json
 
 from os.path import join
 from .repoman import Repoman
-from slyd.projectspec import ProjectSpec
+from slyd.projectspec import ProjectSpec, project_changed, project_revision
 from slyd.gitstorage.projects import retry_operation, GitProjectMixin
 from slyd.errors import BadRequest
 
@@ -12,6 +12,12 @@ class GitProjectSpec(GitProjectMixin, ProjectSpec):
     def setup(cls, storage_backend, location, **kwargs):
         Repoman.setup(storage_backend, location)
 
+    def revision(self, spider=None):
+        """Revision of the specs, the head commit of the branch read from"""
+        repo = self._open_repo()
+        head = repo.get_branch(self._get_branch(repo, read_only=True))
+        return project_revision(self.project_name) + (head,)
+
     def _rfile_contents(self, resources):
         return self._open_repo().file_contents_for_branch(
             self._rfile_name(*resources), self._get_branch(read_only=True))
@@ -31,6 +37,7 @@ class GitProjectSpec(GitProjectMixin, ProjectSpec):
         self._open_repo().rename_folder(join('spiders', from_name),
                                         join('spiders', to_name),
                                         self._get_branch())
+        project_changed(self.project_name)
 
     def remove_spider(self, name):
         repo, branch = self._open_repo(), self._get_branch()
@@ -39,6 +46,7 @@ class GitProjectSpec(GitProjectMixin, ProjectSpec):
             if len(split_path) > 2 and split_path[1] == name:
                 repo.delete_file(file_path, branch)
         repo.delete_file(self._rfile_name('spiders', name), branch)
+        project_changed(self.project_name)
 
     def remove_template(self, spider_name, name, save_spider=True):
         try:
@@ -47,6 +55,7 @@ class GitProjectSpec(GitProjectMixin, ProjectSpec):
                 self._get_branch())
         except KeyError:
             pass
+        project_changed(self.project_name)
         if save_spider:
             spider = self.spider_json(spider_name)
             try:
@@ -66,3 +75,4 @@ class GitProjectSpec(GitProjectMixin, ProjectSpec):
         self._open_repo().save_file(self._rfile_name(*resources),
                                     json.dumps(obj, sort_keys=True, indent=4),
                                     self._get_branch())
+        project_changed(self.project_name)
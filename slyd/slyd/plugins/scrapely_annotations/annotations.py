@@ -1,6 +1,6 @@
 import json
 
-from scrapely.htmlpage import parse_html, HtmlTag, HtmlDataFragment
+from scrapely.htmlpage import HtmlTag, HtmlDataFragment
 
 from collections import defaultdict
 from itertools import tee, count
@@ -223,8 +223,8 @@ def _annotation_key(a):
 
 def apply_annotations(annotations, target_page):
     inserts = defaultdict(list)
-    numbered_html = add_tagids(target_page)
-    target = parse_html(numbered_html)
+    numbered_html, numbered_elements = add_tagids(target_page, parsed=True)
+    target = iter(numbered_elements)
     output, tag_stack = [], []
 
     element = next(target)
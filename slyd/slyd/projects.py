@@ -5,6 +5,7 @@ from twisted.internet.defer import Deferred
 from twisted.web.resource import NoResource
 from twisted.web.server import NOT_DONE_YET
 from .errors import BaseError, BaseHTTPError, BadRequest
+from .projectspec import project_changed
 from .projecttemplates import templates
 from .resource import SlydJsonResource, SlydJsonErrorPage
 from .utils.copy import FileSystemSpiderCopier
@@ -15,6 +16,11 @@ from .utils.download import FileSystemProjectArchiver
 _INVALID_PROJECT_RE = re.compile('[^A-Za-z0-9._]|^\.*$')
 
 
+def _project_changed(result):
+    project_changed()
+    return result
+
+
 def create_projects_manager_resource(spec_manager):
     return ProjectsManagerResource(spec_manager)
 
@@ -91,11 +97,17 @@ class ProjectsManagerResource(SlydJsonResource):
         obj = self.read_json(request)
         try:
             retval = self.handle_project_command(project_manager, obj)
+            # These commands may change the specs of any project
+            changing = obj.get('cmd') in project_manager.changing_commands
             modifier = project_manager.modify_request.get(obj.get('cmd'))
             if isinstance(retval, Deferred):
+                if changing:
+                    retval.addBoth(_project_changed)
                 retval.addCallbacks(finish_request, request_failed)
                 return NOT_DONE_YET
             else:
+                if changing:
+                    project_changed()
                 if modifier:
                     retval = modifier(request, obj, retval)
                 return retval
@@ -129,6 +141,7 @@ class ProjectsManager(object):
             'copy': self.copy_data,
             'download': self.download_project
         }
+        self.changing_commands = {'create', 'mv', 'rm', 'copy'}
 
     def all_projects(self):
         try:
@@ -3,6 +3,8 @@ import json, re, shutil, errno, os
 
 import slyd.errors
 
+from collections import defaultdict
+
 from os.path import join, splitext
 from scrapy.http import HtmlResponse
 from twisted.web.resource import NoResource, ForbiddenResource
@@ -15,10 +17,25 @@ from .utils.projects import allowed_file_name, ProjectModifier
 from .utils.extraction import extract_items
 
 
+# Number of changes made by this process to the specs of each project, under
+# None for changes that may affect any project
+_revisions = defaultdict(int)
+
+
 def create_project_resource(spec_manager):
     return ProjectResource(spec_manager)
 
 
+def project_revision(project_name):
+    """Revision of the specs of a project as seen by this process"""
+    return _revisions[None], _revisions[project_name]
+
+
+def project_changed(project_name=None):
+    """Mark the specs of a project, or of all projects, as changed"""
+    _revisions[project_name] += 1
+
+
 def convert_template(template):
     """Converts the template annotated body for being used in the UI."""
     template['annotated_body'] = html4annotation(
@@ -47,6 +64,33 @@ class ProjectSpec(object):
             'rmt': self.remove_template,
         }
 
+    def revision(self, spider=None):
+        """Revision of the specs used to build a spider
+
+        Changes made by this process are combined with the modification
+        times of the files of the spider, its templates, the items and the
+        extractors so that changes saved by other processes are seen too.
+        """
+        paths = [self._rfilename('items'), self._rfilename('extractors')]
+        if spider is not None:
+            dirname = join(self.project_dir, 'spiders', spider)
+            paths.extend([self._rfilename('spiders', spider), dirname])
+            try:
+                paths.extend(join(dirname, fname)
+                             for fname in sorted(os.listdir(dirname)))
+            except OSError as ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+        mtimes = []
+        for path in paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except OSError as ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+                mtimes.append(None)
+        return project_revision(self.project_name) + tuple(mtimes)
+
     def list_spiders(self):
         try:
             for fname in os.listdir(join(self.project_dir, "spiders")):
@@ -104,9 +148,11 @@ class ProjectSpec(object):
         dirname = self._rdirname('spiders', from_name)
         if os.path.isdir(dirname):
             os.rename(dirname, self._rdirname('spiders', to_name))
+        project_changed(self.project_name)
 
     def remove_spider(self, name):
         os.remove(self._rfilename('spiders', name))
+        project_changed(self.project_name)
 
     def rename_template(self, spider_name, from_name, to_name):
         template = self.resource('spiders', spider_name, from_name)
@@ -179,6 +225,7 @@ class ProjectSpec(object):
             pass
         with self._rfile(*resources, mode='wb') as ouf:
             json.dump(obj, ouf, sort_keys=True, indent=4)
+        project_changed(self.project_name)
 
     def json(self, out):
         """Write spec as json to the file-like object
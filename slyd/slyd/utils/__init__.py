@@ -4,7 +4,8 @@ html page utils
 from __future__ import absolute_import
 from uuid import uuid4
 
-from scrapely.htmlpage import HtmlPage, HtmlTag, HtmlTagType
+from scrapely.htmlpage import HtmlTagType
+from slybot.utils import add_tagids, remove_tagids
 
 
 TAGID = u"data-tagid"
@@ -66,44 +67,5 @@ def serialize_tag(tag):
     return out + ">"
 
 
-def _must_add_tagid(element):
-    return (isinstance(element, HtmlTag) and
-            element.tag_type != CLOSE_TAG and
-            element.tag != 'ins')
-
-
-def _modify_tagids(source, add=True):
-    """Add or remove tags ids to/from HTML document"""
-    output = []
-    tagcount = 0
-    if not isinstance(source, HtmlPage):
-        source = HtmlPage(body=source)
-    for element in source.parsed_body:
-        if _must_add_tagid(element):
-            if add:
-                element.attributes[TAGID] = str(tagcount)
-                tagcount += 1
-            else:  # Remove previously added tagid
-                element.attributes.pop(TAGID, None)
-            output.append(serialize_tag(element))
-        else:
-            output.append(source.body[element.start:element.end])
-
-    return ''.join(output)
-
-
-def add_tagids(source):
-    """
-    Applies a unique attribute code number for each tag element in order to be
-    identified later in the process of apply annotation"""
-    return _modify_tagids(source)
-
-
-def remove_tagids(source):
-    """remove from the given page, all tagids previously added by add_tagids()
-    """
-    return _modify_tagids(source, False)
-
-
 def short_guid():
     return '-'.join(str(uuid4()).split('-')[1:4])
@@ -1,11 +1,15 @@
 import json
+import os
 from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
 from twisted.trial import unittest
 from twisted.internet.defer import inlineCallbacks
 from twisted.web.server import Site
 from twisted.web.static import File
 from twisted.internet import reactor
-from slyd.bot import create_bot_resource
+from slyd.bot import create_bot_resource, SpiderCache
+from slyd.projectspec import ProjectSpec, project_changed, project_revision
 from .utils import TestSite, create_spec_manager
 from .settings import RESOURCE_DIR
 
@@ -62,3 +66,47 @@ class BotTest(unittest.TestCase):
     def tearDown(self):
         self.bot_resource.stop()
         self.listen_port.stopListening()
+
+
+class SpiderCacheTest(unittest.TestCase):
+    def test_spider_cache(self):
+        cache = SpiderCache(2)
+        built = []
+
+        def build():
+            built.append(object())
+            return built[-1]
+        spider = cache.get_or_build('a', build)
+        self.assertIs(cache.get_or_build('a', build), spider)
+        cache.get_or_build('b', build)
+        cache.get_or_build('c', build)
+        self.assertIsNot(cache.get_or_build('a', build), spider)
+        self.assertEqual(len(built), 4)
+
+    def test_project_revision(self):
+        revision = project_revision('test')
+        project_changed('test')
+        self.assertNotEqual(project_revision('test'), revision)
+        revision = project_revision('test')
+        project_changed()
+        self.assertNotEqual(project_revision('test'), revision)
+
+    def test_spec_revision(self):
+        # Files saved by other processes change the revision too
+        directory = mkdtemp()
+        self.addCleanup(rmtree, directory)
+        pspec = ProjectSpec('test', {'username': 'testuser'})
+        pspec.project_dir = directory
+        os.makedirs(join(directory, 'spiders', 'spider'))
+        for path in ('items', 'extractors', join('spiders', 'spider'),
+                     join('spiders', 'spider', 'template')):
+            with open(join(directory, path + '.json'), 'w') as f:
+                f.write('{}')
+        revision = pspec.revision('spider')
+        self.assertEqual(pspec.revision('spider'), revision)
+        template = join(directory, 'spiders', 'spider', 'template.json')
+        os.utime(template, (1, 1))
+        self.assertNotEqual(pspec.revision('spider'), revision)
+        revision = pspec.revision('spider')
+        os.utime(join(directory, 'items.json'), (1, 1))
+        self.assertNotEqual(pspec.revision('spider'), revision)